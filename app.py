@@ -1,12 +1,30 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
+from typing import List
 import uvicorn
-from terminal_scraper import main as scraper_main
-import asyncio
+import os
+import logging
+from terminal_scraper import main as scraper_main, main_stream as scraper_stream, main_batch as scraper_batch
+import terminal_scraper
+import http_client
+import checkpoints
+import metrics
+import renderer
+import shared_state
+from query_cache import QueryResultCache
+from jobs import JobManager, SharedJobManager, QueueFullError
+import json
 import re
 
+# uvicorn worker processes when run as `python app.py`. More than one needs SHARED_BACKEND,
+# or each process keeps its own jobs and cache
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+
 app = FastAPI(title="Company Research API")
+result_cache = QueryResultCache(backend=shared_state.backend)
 
 # Configure CORS
 app.add_middleware(
@@ -17,45 +35,235 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    # One pooled HTTP client shared by every request handled by this process
+    await http_client.start()
+    # Browser contexts for thin JS pages; Chromium itself starts on the first page that needs it
+    await renderer.start()
+    # Start the parse workers now rather than on the first request
+    await terminal_scraper.warm_parse_pool()
+    await job_manager.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await job_manager.stop()
+    await renderer.close()
+    await http_client.close()
+    terminal_scraper.shutdown_parse_pool()
+
 class SearchQuery(BaseModel):
     query: str
+    # Return seconds spent per stage (search, fetch, waits, parse, extraction) with the result
+    timings: bool = False
+
+class BatchQuery(BaseModel):
+    queries: List[str]
+    # Only return pages that changed since these companies were last crawled
+    incremental: bool = False
+
+# Every character \s matches, mapped to a space so one regex collapses all whitespace runs
+WHITESPACE_TO_SPACE = str.maketrans(dict.fromkeys(
+    '\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f\x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006'
+    '\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000', ' '))
+SPACE_RUN_RE = re.compile(' {2,}')
 
 def clean_output(text):
-    """Clean the output by removing unwanted characters and formatting."""
-    # Remove asterisks
-    text = re.sub(r'\*+', '', text)
-    # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text)
-    # Remove empty lines
-    text = re.sub(r'\n\s*\n', '\n', text)
-    return text.strip()
+    """Clean the output by removing asterisks and collapsing whitespace to single spaces."""
+    # String methods run in C; only the space collapse needs the regex engine
+    return SPACE_RUN_RE.sub(' ', text.translate(WHITESPACE_TO_SPACE).replace('*', '')).strip()
+
+def clean_result(result):
+    """Clean the scraper result into the strings returned by the API."""
+    if isinstance(result, dict) and 'sites' in result:
+        # Entities are already normalized; only the site records are flattened to text
+        return {'sites': clean_result(result['sites']), 'entities': result['entities']}
+    if isinstance(result, list):
+        return [
+            clean_output(r["content"] if isinstance(r, dict) and "content" in r else str(r))
+            for r in result
+        ]
+    return clean_output(result)
+
+def split_entities(result):
+    """Split a cleaned result into the site list returned as "result" and the company's "entities".
+
+    Results cached before entities were collected have none.
+    """
+    if isinstance(result, dict) and 'sites' in result:
+        return result['sites'], result['entities']
+    return result, None
+
+def split_batch_entities(results):
+    """Split a batch's {query: cleaned result} into {query: site list} and {query: entities}."""
+    split = {query: split_entities(result) for query, result in results.items()}
+    return ({query: sites for query, (sites, _) in split.items()},
+            {query: entities for query, (_, entities) in split.items()})
+
+async def run_research(query, progress=None, checkpoint=None):
+    # Run the existing scraper
+    result = await scraper_main(query, progress=progress, checkpoint=checkpoint)
+    return clean_result(result)
+
+async def run_batch(queries, progress=None, incremental=False):
+    if incremental:
+        # A diff is relative to the previous crawl, so it is neither cached nor served from the cache
+        batch = await scraper_batch(queries, progress=progress, incremental=True)
+        return {query: clean_result(result) for query, result in batch.items()}
+    # Queries answered recently come from the cache; the rest are crawled together
+    results = {}
+    pending = []
+    for query in dict.fromkeys(queries):
+        cached = await result_cache.get(query)
+        if cached is not None:
+            results[query] = cached
+        else:
+            pending.append(query)
+    if pending:
+        batch = await scraper_batch(pending, progress=progress)
+        for query, result in batch.items():
+            results[query] = clean_result(result)
+            await result_cache.put(query, results[query])
+    return results
+
+async def run_job(job):
+    if isinstance(job.query, list):
+        # Batch jobs are not checkpointed; a resumed batch job starts over
+        return await run_batch(job.query, progress=job.update_progress, incremental=job.incremental)
+    checkpoint = checkpoints.store.for_job(job.id) if checkpoints.store else None
+    return await result_cache.get_or_run(
+        job.query, lambda: run_research(job.query, progress=job.update_progress, checkpoint=checkpoint))
+
+if shared_state.backend is not None:
+    # API processes only queue jobs; crawl worker processes (worker.py) run them
+    job_manager = SharedJobManager(run_job, shared_state.backend, workers=0)
+else:
+    job_manager = JobManager(run_job, store=checkpoints.store)
 
 @app.post("/research")
 async def research_company(query: SearchQuery):
     try:
-        # Run the existing scraper
-        result = await scraper_main(query.query)
-        
-        # Clean and format the output
-        if isinstance(result, list):
-            cleaned_result = [
-                clean_output(r["content"] if isinstance(r, dict) and "content" in r else str(r))
-                for r in result
-            ]
-        else:
-            cleaned_result = clean_output(result)
+        # Repeats within the TTL are served from the cache; the rest run as jobs, so JOB_WORKERS bounds
+        # the crawls and identical concurrent queries share one. A cached, joined or shared-mode result
+        # reports only the time this request waited.
+        with metrics.timing_breakdown() as timings:
+            cleaned_result = await result_cache.get(query.query)
+            if cleaned_result is None:
+                cleaned_result = await job_manager.submit_and_wait(query.query)
         
-        return {
+        result, entities = split_entities(cleaned_result)
+        response = {
             "status": "success",
             "query": query.query,
-            "result": cleaned_result
+            "result": result,
+            "entities": entities
         }
+        if query.timings:
+            response["timings"] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+        return response
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/research/batch")
+async def research_batch(batch: BatchQuery):
+    if not batch.queries:
+        raise HTTPException(status_code=400, detail="No queries given")
+    try:
+        results, entities = split_batch_entities(
+            await job_manager.submit_and_wait(batch.queries, incremental=batch.incremental))
+        return {
+            "status": "success",
+            "results": results,
+            "entities": entities
+        }
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def stream_research(query, slot=None):
+    # One JSON object per line, sent as soon as each page or document is ready
+    try:
+        if slot:
+            await slot.acquire()
+        async for event in scraper_stream(query):
+            yield json.dumps(event) + "\n"
+    finally:
+        if slot:
+            slot.release()
+
+@app.post("/research/stream")
+async def research_company_stream(query: SearchQuery):
+    slot = None
+    if shared_state.backend is None:
+        # The stream runs in this process but takes a job worker, so it counts against JOB_WORKERS
+        try:
+            slot = job_manager.reserve_slot()
+        except QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    return StreamingResponse(
+        stream_research(query.query, slot),
+        media_type="application/x-ndjson",
+        # Stop nginx from buffering the stream
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+@app.post("/jobs", status_code=202)
+async def create_job(query: SearchQuery):
+    try:
+        job = await job_manager.submit(query.query)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return job.to_dict()
+
+@app.post("/jobs/batch", status_code=202)
+async def create_batch_job(batch: BatchQuery):
+    if not batch.queries:
+        raise HTTPException(status_code=400, detail="No queries given")
+    try:
+        job = await job_manager.submit(batch.queries, incremental=batch.incremental)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    if isinstance(job.query, list):
+        result, entities = split_batch_entities(job.result)
+    else:
+        result, entities = split_entities(job.result)
+    return {
+        "status": "success",
+        "query": job.query,
+        "result": result,
+        "entities": entities
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
 if __name__ == "__main__":
-    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    if API_WORKERS > 1 and shared_state.backend is None:
+        logging.warning("API_WORKERS > 1 without SHARED_BACKEND: each worker keeps its own jobs and cache")
+    uvicorn.run("app:app", host="0.0.0.0", port=8000, workers=API_WORKERS)
@@ -0,0 +1,361 @@
+"""Crawl, document and /research throughput against a local mock web farm.
+
+Usage:
+    python benchmarks/bench_crawl.py [--sites N] [--pages N] [--fanout N] [--docs N]
+                                     [--slow-fraction F] [--throttle-fraction F] [--json PATH] [--keep-work-dir]
+
+Every synthetic site is served by an aiohttp server on its own localhost port,
+so per-host politeness applies per site as it would on the web. Sites have
+robots.txt, a sitemap, linked pages (a fraction of them slow or answering 429
+once), and PDF/DOCX/XLSX/PPTX documents. No network access is needed: search
+results are replaced with the farm's sites, and the response cache, download
+store, fingerprint and checkpoint databases are placed in a temporary directory,
+deleted at exit unless --keep-work-dir is given.
+
+Reports pages/sec, p50/p99 request latency, peak RSS and bytes transferred for
+recursive_crawl_async, process_documents_async and POST /research.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# Spawned parse workers import this module again; they inherit the environment and reuse the parent's directory
+WORK_DIR = os.environ.get("BENCH_CRAWL_WORK_DIR") or tempfile.mkdtemp(prefix="bench_crawl_")
+os.environ["BENCH_CRAWL_WORK_DIR"] = WORK_DIR
+# Set before the scraper modules read them at import time
+os.environ.setdefault("RESPONSE_CACHE_DIR", os.path.join(WORK_DIR, "http_cache"))
+os.environ.setdefault("DOWNLOAD_STORE_DIR", os.path.join(WORK_DIR, "downloads"))
+os.environ.setdefault("FINGERPRINT_DB", os.path.join(WORK_DIR, "fingerprints.sqlite3"))
+# The in-process API restores unfinished jobs from its checkpoints at startup; never those of a real deployment
+os.environ.setdefault("CHECKPOINT_DB", os.path.join(WORK_DIR, "checkpoints.sqlite3"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ["revenue", "team", "product", "customers", "growth", "contact", "offices", "market",
+         "founded", "platform", "investors", "partners", "engineering", "support", "pricing"]
+DOCUMENT_TYPES = [".pdf", ".docx", ".xlsx", ".pptx"]
+
+def sentence(rng, low=8, high=30):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+def make_document(ext, title, rng):
+    """Build a small document of the given type in memory."""
+    buffer = io.BytesIO()
+    if ext == ".pdf":
+        import fitz
+        doc = fitz.open()
+        for _ in range(3):
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 550, 800), title + "\n" + sentence(rng, 100, 200))
+        doc.save(buffer)
+    elif ext == ".docx":
+        import docx
+        doc = docx.Document()
+        doc.add_heading(title)
+        for _ in range(20):
+            doc.add_paragraph(sentence(rng))
+        doc.save(buffer)
+    elif ext == ".xlsx":
+        import openpyxl
+        wb = openpyxl.Workbook()
+        wb.active.append(["name", "value", "note"])
+        for row in range(200):
+            wb.active.append([f"{title} {row}", rng.randint(0, 10**6), sentence(rng, 2, 6)])
+        wb.save(buffer)
+    elif ext == ".pptx":
+        import pptx
+        prs = pptx.Presentation()
+        for _ in range(5):
+            slide = prs.slides.add_slide(prs.slide_layouts[1])
+            slide.shapes.title.text = title
+            slide.placeholders[1].text = sentence(rng)
+        prs.save(buffer)
+    return buffer.getvalue()
+
+class MockFarm:
+    """Synthetic sites served from one aiohttp app listening on one port per site."""
+
+    def __init__(self, args):
+        self.args = args
+        self.base_port = args.base_port
+        self.bytes_sent = 0
+        self.requests = 0
+        self.throttled = set()
+        self.runner = None
+        rng = random.Random(args.seed)
+        self.links = {}
+        self.slow = set()
+        self.throttle = set()
+        self.documents = {}
+        for site in range(args.sites):
+            for page in range(args.pages):
+                self.links[site, page] = rng.sample(range(args.pages), min(args.fanout, args.pages))
+                if rng.random() < args.slow_fraction:
+                    self.slow.add((site, page))
+                if rng.random() < args.throttle_fraction:
+                    self.throttle.add((site, page))
+            for number in range(args.docs):
+                ext = DOCUMENT_TYPES[number % len(DOCUMENT_TYPES)]
+                self.documents[site, f"/files/report-{number}{ext}"] = make_document(
+                    ext, f"Site {site} report {number}", rng)
+
+    def site_url(self, site):
+        return f"http://127.0.0.1:{self.base_port + site}"
+
+    def page_path(self, page):
+        return "/" if page == 0 else f"/p/{page}"
+
+    def render_page(self, site, page):
+        rng = random.Random(f"{self.args.seed}-{site}-{page}")
+        parts = [f"<html><head><title>Site {site} page {page}</title>",
+                 f'<meta name="description" content="{sentence(rng)}"></head><body>']
+        for _ in range(self.args.paragraphs):
+            parts.append(f"<h2>{sentence(rng, 3, 6)}</h2><p>{sentence(rng)}</p>")
+        parts.append("<ul>" + "".join(f"<li>{sentence(rng, 3, 8)}</li>" for _ in range(8)) + "</ul>")
+        for target in self.links[site, page]:
+            parts.append(f"<a href='{self.page_path(target)}'>{sentence(rng, 1, 3)}</a>")
+        if self.args.docs and page % self.args.doc_every == 0:
+            number = (page // self.args.doc_every) % self.args.docs
+            parts.append(f"<a href='/files/report-{number}{DOCUMENT_TYPES[number % len(DOCUMENT_TYPES)]}'>report</a>")
+        parts.append(f"<footer>info@site{site}.example +1 (555) 010-{site:04d}</footer></body></html>")
+        return "".join(parts)
+
+    async def handle(self, request):
+        from aiohttp import web
+        site = request.url.port - self.base_port
+        path = request.path
+        if path == "/robots.txt":
+            return web.Response(text=f"User-agent: *\nDisallow: /private\nSitemap: {self.site_url(site)}/sitemap.xml\n")
+        if path == "/sitemap.xml":
+            entries = "".join(f"<url><loc>{self.site_url(site)}{self.page_path(page)}</loc></url>"
+                              for page in range(0, self.args.pages, 3))
+            return web.Response(text='<?xml version="1.0" encoding="UTF-8"?><urlset '
+                                     f'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>',
+                                content_type="application/xml")
+        if (site, path) in self.documents:
+            return web.Response(body=self.documents[site, path], content_type="application/octet-stream")
+        if path == "/":
+            page = 0
+        elif path.startswith("/p/") and path[3:].isdigit() and int(path[3:]) < self.args.pages:
+            page = int(path[3:])
+        else:
+            return web.Response(status=404, text="not found")
+        if (site, page) in self.throttle and (site, page) not in self.throttled:
+            self.throttled.add((site, page))
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        if (site, page) in self.slow:
+            await asyncio.sleep(self.args.slow_ms / 1000)
+        return web.Response(text=self.render_page(site, page), content_type="text/html")
+
+    async def start(self):
+        from aiohttp import web
+
+        @web.middleware
+        async def count_bytes(request, handler):
+            response = await handler(request)
+            self.requests += 1
+            if response.body is not None:
+                self.bytes_sent += len(response.body)
+            return response
+
+        app = web.Application(middlewares=[count_bytes])
+        app.router.add_get("/{path:.*}", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        for site in range(self.args.sites):
+            await web.TCPSite(self.runner, "127.0.0.1", self.base_port + site).start()
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+def latency_tracer(samples):
+    """aiohttp TraceConfig that appends each request's latency in seconds to `samples`."""
+    import aiohttp
+
+    async def on_start(session, context, params):
+        context.started = time.perf_counter()
+
+    async def on_end(session, context, params):
+        samples.append(time.perf_counter() - context.started)
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_start)
+    trace.on_request_end.append(on_end)
+    return trace
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux; children covers the parse pool processes
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, children
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+class Phase:
+    def __init__(self, name, farm, latencies):
+        self.name = name
+        self.farm = farm
+        self.latencies = latencies
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.bytes_before = self.farm.bytes_sent
+        self.requests_before = self.farm.requests
+        self.latencies.clear()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+        return False
+
+    def report(self, items, unit):
+        own, children = peak_rss_mb()
+        stats = {
+            "phase": self.name,
+            unit: items,
+            "seconds": round(self.elapsed, 3),
+            f"{unit}_per_sec": round(items / self.elapsed, 2) if self.elapsed else 0.0,
+            "requests": self.farm.requests - self.requests_before,
+            "p50_ms": round(statistics.median(self.latencies) * 1000, 2) if self.latencies else 0.0,
+            "p99_ms": round(percentile(self.latencies, 0.99) * 1000, 2),
+            "bytes": self.farm.bytes_sent - self.bytes_before,
+            "peak_rss_mb": round(own, 1),
+            "peak_child_rss_mb": round(children, 1),
+        }
+        print(f"{self.name:<10} {items:6d} {unit:<9} {self.elapsed:8.2f} s  {stats[unit + '_per_sec']:8.2f} {unit}/s  "
+              f"requests {stats['requests']:6d}  p50 {stats['p50_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms  "
+              f"{stats['bytes'] / 1024:9.0f} KiB  peak RSS {own:6.0f} MiB (+{children:.0f} MiB workers)")
+        return stats
+
+async def run_research(app_port, queries, latencies):
+    """Drive POST /research on an in-process uvicorn server, one query at a time."""
+    import aiohttp
+    import uvicorn
+    import app as api
+
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=app_port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None)) as client:
+            for query in queries:
+                started = time.perf_counter()
+                async with client.post(f"http://127.0.0.1:{app_port}/research", json={"query": query}) as resp:
+                    await resp.read()
+                    if resp.status != 200:
+                        print(f"/research returned {resp.status} for {query!r}")
+                latencies.append(time.perf_counter() - started)
+    finally:
+        server.should_exit = True
+        await serving
+
+async def run(args):
+    import http_client
+    import terminal_scraper
+
+    # Expected 404s, 429s and robots.txt skips would drown out the report
+    logging.getLogger().setLevel(logging.ERROR)
+    farm = MockFarm(args)
+    await farm.start()
+    sites = [farm.site_url(site) for site in range(args.sites)]
+    # Each research query covers a few sites instead of searching the web
+    terminal_scraper.google_search_urls = lambda query, num_results=20: [
+        sites[int(query.rsplit(" ", 1)[1]) % len(sites)], sites[(int(query.rsplit(" ", 1)[1]) + 1) % len(sites)]]
+    # The first site of each query stands in for the company's own website
+    terminal_scraper.company_website = lambda query: sites[int(query.rsplit(" ", 1)[1]) % len(sites)]
+    latencies = []
+    session = http_client.create_session(trace_configs=[latency_tracer(latencies)])
+    results = []
+    try:
+        await terminal_scraper.warm_parse_pool()
+        with Phase("crawl", farm, latencies) as phase:
+            crawled = await asyncio.gather(*[
+                terminal_scraper.recursive_crawl_async(url, max_pages=args.max_pages, max_depth=args.max_depth,
+                                                       session=session)
+                for url in sites])
+        results.append(phase.report(sum(len(pages) for pages in crawled), "pages"))
+
+        doc_links = sorted({link for pages in crawled for page in pages for link in page.get("documents", [])})
+        with Phase("documents", farm, latencies) as phase:
+            documents = await terminal_scraper.process_documents_async(doc_links, session=session)
+        results.append(phase.report(len(documents), "documents"))
+
+        if args.research_queries:
+            # The API process shares its HTTP client; hand it the traced one
+            http_client._session = session
+            research_latencies = []
+            # main_stream narrates its progress on stdout
+            with Phase("research", farm, latencies) as phase, contextlib.redirect_stdout(io.StringIO()):
+                await run_research(args.app_port, [f"Benchmark Company {n}" for n in range(args.research_queries)],
+                                   research_latencies)
+            stats = phase.report(args.research_queries, "queries")
+            stats["request_p50_ms"] = round(statistics.median(research_latencies) * 1000, 2)
+            stats["request_p99_ms"] = round(percentile(research_latencies, 0.99) * 1000, 2)
+            print(f"{'':<10} /research end-to-end p50 {stats['request_p50_ms']:.0f} ms  "
+                  f"p99 {stats['request_p99_ms']:.0f} ms")
+            results.append(stats)
+    finally:
+        if not session.closed:
+            await session.close()
+        terminal_scraper.shutdown_parse_pool()
+        await farm.stop()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sites", type=int, default=5, help="synthetic sites, one port each")
+    parser.add_argument("--pages", type=int, default=60, help="pages per site")
+    parser.add_argument("--fanout", type=int, default=8, help="links per page")
+    parser.add_argument("--paragraphs", type=int, default=20, help="heading + paragraph pairs per page")
+    parser.add_argument("--docs", type=int, default=8, help="documents per site (PDF/DOCX/XLSX/PPTX in turn)")
+    parser.add_argument("--doc-every", type=int, default=5, help="every Nth page links a document")
+    parser.add_argument("--slow-fraction", type=float, default=0.05, help="fraction of pages answered slowly")
+    parser.add_argument("--slow-ms", type=int, default=500, help="delay of slow pages")
+    parser.add_argument("--throttle-fraction", type=float, default=0.05,
+                        help="fraction of pages answering 429 (Retry-After: 1) on their first request")
+    parser.add_argument("--max-pages", type=int, default=30, help="crawl budget per site")
+    parser.add_argument("--max-depth", type=int, default=3, help="crawl depth per site")
+    parser.add_argument("--research-queries", type=int, default=3, help="POST /research calls (0 to skip)")
+    parser.add_argument("--host-rate", type=float, default=None,
+                        help="per-host request rate; default keeps HOST_RATE and the politeness defaults")
+    parser.add_argument("--base-port", type=int, default=18700, help="first port of the farm")
+    parser.add_argument("--app-port", type=int, default=18699, help="port of the in-process API server")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON, e.g. to track them over time")
+    parser.add_argument("--keep-work-dir", action="store_true",
+                        help="keep the cache, downloads and databases written during the run")
+    args = parser.parse_args()
+    args.doc_every = max(1, args.doc_every)
+
+    if args.host_rate:
+        os.environ["HOST_RATE"] = os.environ["HOST_MAX_RATE"] = str(args.host_rate)
+        os.environ["HOST_BURST"] = str(max(1, int(args.host_rate)))
+    print(f"Mock farm: {args.sites} sites x {args.pages} pages, fan-out {args.fanout}, {args.docs} documents per site; "
+          f"work dir {WORK_DIR}")
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if not args.keep_work_dir:
+            shutil.rmtree(WORK_DIR, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results, "timestamp": time.time()}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
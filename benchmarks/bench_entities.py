@@ -0,0 +1,127 @@
+"""Throughput of entity extraction and output cleaning, in MB/s of text.
+
+Usage:
+    python benchmarks/bench_entities.py [CORPUS_DIR] [--size MB] [--repeat N]
+
+CORPUS_DIR holds text to scan (*.txt, searched recursively), one file per
+page. Without it a synthetic corpus of company pages is generated, with
+contact details mixed into dates, prices, IDs and number-heavy tables.
+The per-page regexes the crawler used before are compared with the batched
+entities stage, and the three-pass clean_output with the current one.
+"""
+import argparse
+import glob
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import entities  # noqa: E402
+from app import clean_output  # noqa: E402
+
+WORDS = ["revenue", "team", "product", "customers", "growth", "contact", "offices", "market", "founded",
+         "employees", "platform", "partners", "quarter", "results", "investors"]
+STREETS = ["Main Street", "Market St", "Madison Avenue", "Harbor Blvd", "Oak Road", "Innovation Way"]
+CITIES = ["Springfield, IL 62701", "Austin, TX 78701", "Chicago, IL 60661", "Boston, MA 02110"]
+
+def synthetic_page(rng, index):
+    def sentence():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))) + "."
+
+    parts = [sentence() for _ in range(rng.randint(20, 60))]
+    parts.append(f"Revenue grew to {rng.randint(1, 999)} {rng.randint(100, 999)} {rng.randint(100, 999)} "
+                 f"in {rng.randint(2015, 2024)}-{rng.randint(2015, 2024)}, reported on {rng.randint(1, 12)}/"
+                 f"{rng.randint(1, 28)}/{rng.randint(2015, 2024)}. Order {rng.randint(10**9, 10**12)}.")
+    # Number-heavy tables are where the old phone pattern backtracks and over-matches
+    for _ in range(rng.randint(1, 4)):
+        parts.append("\n".join(" ".join(str(rng.randint(0, 99999)) for _ in range(8)) for _ in range(10)))
+    parts.append(f"Contact: sales{index % 50}@example{index % 7}.com, press@example.org, "
+                 f"+1 ({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(1000, 9999)}, "
+                 f"{rng.randint(200, 999)}.{rng.randint(200, 999)}.{rng.randint(1000, 9999)}")
+    parts.append(f"Visit us at {rng.randint(1, 9999)} {rng.choice(STREETS)}, Suite {rng.randint(100, 999)}, "
+                 f"{rng.choice(CITIES)}.")
+    return "\n".join(parts)
+
+def load_corpus(corpus_dir, size_mb):
+    if corpus_dir:
+        texts = []
+        for path in sorted(glob.glob(os.path.join(corpus_dir, "**", "*.txt"), recursive=True)):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                texts.append(f.read())
+        return texts
+    rng = random.Random(42)
+    texts = []
+    total = 0
+    while total < size_mb * 1024 * 1024:
+        texts.append(synthetic_page(rng, len(texts)))
+        total += len(texts[-1])
+    return texts
+
+def entities_before(texts):
+    # The per-page regexes the crawler used before the entities module
+    found = {'emails': [], 'phones': []}
+    for text in texts:
+        found['emails'].extend(re.findall(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", text))
+        found['phones'].extend(re.findall(r"\+?\d[\d\s().-]{7,}\d", text))
+    return found
+
+def entities_after(texts):
+    return entities.company_entities([], [{'content': text} for text in texts])
+
+def clean_before(texts):
+    results = []
+    for text in texts:
+        text = re.sub(r'\*+', '', text)
+        text = re.sub(r'\s+', ' ', text)
+        text = re.sub(r'\n\s*\n', '\n', text)
+        results.append(text.strip())
+    return results
+
+def clean_after(texts):
+    return [clean_output(text) for text in texts]
+
+def best_time(func, texts, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(texts)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def report(label, seconds, megabytes, detail=""):
+    print(f"{label:<34} {megabytes / seconds:8.1f} MB/s   {seconds * 1000:9.1f} ms   {detail}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus_dir", nargs="?", help="directory of *.txt files to scan")
+    parser.add_argument("--size", type=float, default=8, help="size of the synthetic corpus in MB")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the fastest is kept")
+    args = parser.parse_args()
+
+    texts = load_corpus(args.corpus_dir, args.size)
+    if not texts:
+        sys.exit(f"No *.txt files found under {args.corpus_dir}")
+    megabytes = sum(len(text.encode("utf-8")) for text in texts) / (1024 * 1024)
+    print(f"Corpus: {len(texts)} texts, {megabytes:.1f} MB")
+
+    seconds, before = best_time(entities_before, texts, args.repeat)
+    report("entities, per-page regexes (before)", seconds, megabytes,
+           f"{len(set(before['emails']))} emails, {len(set(before['phones']))} phones")
+    seconds, after = best_time(entities_after, texts, args.repeat)
+    report("entities, batched stage (after)", seconds, megabytes,
+           f"{len(after['emails'])} emails, {len(after['phones'])} phones, {len(after['addresses'])} addresses")
+
+    seconds, before = best_time(clean_before, texts, args.repeat)
+    report("clean_output, three passes (before)", seconds, megabytes)
+    seconds, after = best_time(clean_after, texts, args.repeat)
+    report("clean_output, current (after)", seconds, megabytes)
+    if before != after:
+        print("clean_output results differ")
+
+if __name__ == "__main__":
+    main()
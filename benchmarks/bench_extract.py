@@ -0,0 +1,119 @@
+"""Per-page CPU cost of the BeautifulSoup extractor versus the single-pass lxml extractor.
+
+Usage:
+    python benchmarks/bench_extract.py [CORPUS_DIR] [--repeat N]
+
+CORPUS_DIR holds saved pages (*.html, searched recursively). Without it a
+synthetic corpus is generated. Both extractors also run on every page and
+any difference in their output is reported.
+"""
+import argparse
+import glob
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+import terminal_scraper  # noqa: E402
+
+BASE_URL = "https://www.example.com/company/"
+
+def synthetic_page(rng, index):
+    words = ["revenue", "team", "product", "customers", "growth", "contact", "offices", "market"]
+
+    def sentence():
+        return " ".join(rng.choice(words) for _ in range(rng.randint(8, 30)))
+
+    parts = [f"<html><head><title>Page {index}</title>",
+             f'<meta name="description" content="{sentence()}">',
+             "<style>.a{color:red}</style><script>var x = 1;</script></head><body>"]
+    for section in range(rng.randint(5, 15)):
+        parts.append(f"<h{rng.randint(1, 6)}>{sentence()}</h{rng.randint(1, 6)}>")
+        parts.extend(f"<p>{sentence()} <a href='/p/{rng.randint(0, 500)}'>more</a></p>" for _ in range(rng.randint(2, 8)))
+        parts.append("<ul>" + "".join(f"<li>{sentence()}</li>" for _ in range(rng.randint(2, 10))) + "</ul>")
+        if section % 3 == 0:
+            rows = "".join("<tr>" + "".join(f"<td>{rng.randint(0, 10**6)}</td>" for _ in range(5)) + "</tr>"
+                           for _ in range(rng.randint(3, 20)))
+            parts.append(f"<table>{rows}</table>")
+        parts.append(f"<img src='/img/{section}.png' alt='{sentence()}'>")
+        parts.append(f"<a href='/files/report-{section}.pdf'>report</a>")
+    parts.append("<footer>info@example.com +1 (555) 010-0199</footer></body></html>")
+    return "".join(parts)
+
+def load_corpus(corpus_dir):
+    if corpus_dir:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(corpus_dir, "**", "*.html"), recursive=True)):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                pages.append((path, f.read()))
+        return pages
+    rng = random.Random(42)
+    return [(f"synthetic-{i}", synthetic_page(rng, i)) for i in range(200)]
+
+def extract_bs4(html):
+    return terminal_scraper.extract_detailed_content(BeautifulSoup(html, "lxml"), BASE_URL)
+
+def extract_lxml(html):
+    return terminal_scraper.extract_page(html, BASE_URL)
+
+def time_per_page(extract, pages, repeat):
+    timings = []
+    for _, html in pages:
+        best = None
+        for _ in range(repeat):
+            started = time.process_time()
+            extract(html)
+            elapsed = time.process_time() - started
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append(best * 1000)
+    return timings
+
+def compare_outputs(pages):
+    mismatches = []
+    for name, html in pages:
+        old, new = extract_bs4(html), extract_lxml(html)
+        for key in old:
+            # extract_links/extract_documents return sets, so only membership is comparable
+            if key in ("links", "documents"):
+                same = set(old[key]) == set(new[key])
+            else:
+                same = old[key] == new[key]
+            if not same:
+                mismatches.append((name, key))
+    return mismatches
+
+def report(label, timings):
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{label:<28} mean {statistics.mean(timings):8.2f} ms   p50 {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus_dir", nargs="?", help="directory of saved *.html pages")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per page; the fastest is kept")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus_dir)
+    if not pages:
+        sys.exit(f"No *.html files found under {args.corpus_dir}")
+    total_kb = sum(len(html) for _, html in pages) / 1024
+    print(f"Corpus: {len(pages)} pages, {total_kb:.0f} KiB")
+
+    mismatches = compare_outputs(pages)
+    print(f"Output mismatches: {len(mismatches)}")
+    for name, key in mismatches[:20]:
+        print(f"  {name}: {key}")
+
+    before = time_per_page(extract_bs4, pages, args.repeat)
+    after = time_per_page(extract_lxml, pages, args.repeat)
+    report("BeautifulSoup (before)", before)
+    report("single-pass lxml (after)", after)
+    print(f"Speedup: {sum(before) / sum(after):.1f}x per page CPU time")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Research jobs and their crawl progress, persisted so a restarted process can resume them
+CHECKPOINTS_ENABLED = os.getenv("CHECKPOINTS_ENABLED", "true").lower() not in ("0", "false", "no")
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", os.path.join("data", "checkpoints.sqlite3"))
+# Seconds between checkpoints of a site that is being crawled
+CHECKPOINT_INTERVAL = float(os.getenv("CHECKPOINT_INTERVAL", "15"))
+
+# Site key under which a job's search results are saved
+SEEDS_KEY = ""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sites (
+    job_id TEXT NOT NULL,
+    site TEXT NOT NULL,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, site)
+);
+"""
+
+class CheckpointStore:
+    """SQLite store of job records and per-site crawl checkpoints.
+
+    Several processes may share the file, so a call can wait for another's
+    write lock; async code runs the methods with asyncio.to_thread, and each
+    thread gets its own connection.
+    """
+
+    def __init__(self, path=CHECKPOINT_DB):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            db = sqlite3.connect(self.path)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+            self._local.db = db
+        return db
+
+    def save_job(self, job_id, state):
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?)", (job_id, json.dumps(state), time.time()))
+
+    def load_jobs(self):
+        jobs = []
+        for job_id, state in self._connect().execute("SELECT id, state FROM jobs ORDER BY updated_at"):
+            try:
+                jobs.append(json.loads(state))
+            except ValueError:
+                logging.warning(f"Discarding unreadable checkpoint of job {job_id}")
+        return jobs
+
+    def delete_job(self, job_id):
+        with self._connect() as db:
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            db.execute("DELETE FROM sites WHERE job_id = ?", (job_id,))
+
+    def save_site(self, job_id, site, state):
+        self.write_site(job_id, site, json.dumps(state, default=list))
+
+    def write_site(self, job_id, site, data):
+        """Save a site state already serialized by json.dumps."""
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO sites VALUES (?, ?, ?, ?)", (job_id, site, data, time.time()))
+
+    def load_site(self, job_id, site):
+        row = self._connect().execute("SELECT state FROM sites WHERE job_id = ? AND site = ?",
+                                      (job_id, site)).fetchone()
+        if row is None:
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return None
+
+    def delete_sites(self, job_id):
+        with self._connect() as db:
+            db.execute("DELETE FROM sites WHERE job_id = ?", (job_id,))
+
+    def for_job(self, job_id):
+        return JobCheckpoint(self, job_id)
+
+class JobCheckpoint:
+    """Crawl checkpoints of one research job, keyed by seed site.
+
+    A site's state holds its page records and documents so far, whether its
+    crawl phase is complete, and while it is not, the crawl frontier ('pending'
+    URL -> [priority, depth]) and seen set. Saves of an in-progress site are
+    throttled to one per CHECKPOINT_INTERVAL. Reads and writes run in a thread.
+    """
+
+    def __init__(self, store, job_id, interval=CHECKPOINT_INTERVAL):
+        self.store = store
+        self.job_id = job_id
+        self.interval = interval
+        self._saved_at = {}
+
+    async def load(self, site):
+        return await asyncio.to_thread(self.store.load_site, self.job_id, site)
+
+    async def load_seeds(self):
+        return await self.load(SEEDS_KEY)
+
+    async def save_seeds(self, urls):
+        await self.save(SEEDS_KEY, urls, force=True)
+
+    async def save(self, site, state, force=False):
+        now = time.monotonic()
+        if not force and now - self._saved_at.get(site, 0.0) < self.interval:
+            return
+        self._saved_at[site] = now
+        try:
+            # Serialized on the loop: the crawl keeps changing its frontier while the write runs
+            data = json.dumps(state, default=list)
+            await asyncio.to_thread(self.store.write_site, self.job_id, site, data)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logging.warning(f"Could not checkpoint {site} for job {self.job_id}: {e}")
+
+store = CheckpointStore() if CHECKPOINTS_ENABLED else None
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+
+# Downloaded documents, stored by SHA-256 of their content, plus their extracted text
+DOWNLOAD_STORE_DIR = os.getenv("DOWNLOAD_STORE_DIR", os.path.join("data", "downloads"))
+DOWNLOAD_STORE_MAX_BYTES = int(os.getenv("DOWNLOAD_STORE_MAX_BYTES", str(1024 * 1024 * 1024)))
+EVICT_EVERY = 20
+
+def link_or_copy(src, dest):
+    """Hard-link src to dest when both live on one filesystem, else copy it."""
+    try:
+        os.link(src, dest)
+    except OSError:
+        with open(src, 'rb') as fin, open(dest, 'wb') as fout:
+            while True:
+                chunk = fin.read(1024 * 1024)
+                if not chunk:
+                    break
+                fout.write(chunk)
+
+class DownloadStore:
+    """Content-addressed file store with an extracted-text cache and size-capped LRU eviction.
+
+    Files are written to a unique temporary path while being hashed, then moved
+    to objects/<hash[:2]>/<hash><ext>. Identical content found under different
+    URLs is stored once, and parallel downloads never share a path.
+    """
+
+    def __init__(self, root=DOWNLOAD_STORE_DIR, max_bytes=DOWNLOAD_STORE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._commits = 0
+        self._evicting = None
+        self._evict_lock = threading.Lock()
+
+    def temp_path(self):
+        folder = os.path.join(self.root, 'tmp')
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, uuid.uuid4().hex)
+
+    def _object_path(self, digest, ext):
+        return os.path.join(self.root, 'objects', digest[:2], digest + ext)
+
+    def _text_path(self, digest):
+        return os.path.join(self.root, 'text', digest[:2], digest + '.txt')
+
+    def commit(self, tmp_path, digest, ext=''):
+        """Move a fully written temporary file to its content address and return that path."""
+        path = self._object_path(digest, ext.lower())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            os.utime(path)
+        else:
+            os.replace(tmp_path, path)
+        self._commits += 1
+        if self._commits % EVICT_EVERY == 0:
+            self._schedule_evict()
+        return path
+
+    def _schedule_evict(self):
+        # Eviction walks and stats the whole store; keep it off the event loop when there is one
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from a thread (or sync code) that is already off the loop
+            self.evict()
+            return
+        if self._evicting is None or self._evicting.done():
+            self._evicting = loop.run_in_executor(None, self.evict)
+
+    def add_file(self, src_path, ext=''):
+        """Hash an existing file (e.g. a cached response body) and add it to the store.
+
+        Reads the whole file; async callers run it with asyncio.to_thread.
+        """
+        hasher = hashlib.sha256()
+        with open(src_path, 'rb') as f:
+            while True:
+                chunk = f.read(1024 * 1024)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+        tmp_path = self.temp_path()
+        link_or_copy(src_path, tmp_path)
+        return self.commit(tmp_path, hasher.hexdigest(), ext)
+
+    @staticmethod
+    def digest_of(path):
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def get_text(self, digest):
+        """Return previously extracted text for this content, or None."""
+        path = self._text_path(digest)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return text
+
+    def put_text(self, digest, text):
+        path = self._text_path(digest)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not cache extracted text for {digest}: {e}")
+
+    def evict(self):
+        """Delete least recently used files until the store is under max_bytes."""
+        # Commits from several threads may ask at once; one walk is enough
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            self._evict()
+        finally:
+            self._evict_lock.release()
+
+    def _evict(self):
+        # Temporary files left behind by interrupted downloads
+        stale_before = time.time() - 3600
+        for folder, _, files in os.walk(os.path.join(self.root, 'tmp')):
+            for name in files:
+                path = os.path.join(folder, name)
+                try:
+                    if os.stat(path).st_mtime < stale_before:
+                        os.remove(path)
+                except OSError:
+                    pass
+        entries = []
+        for subdir in ('objects', 'text'):
+            for folder, _, files in os.walk(os.path.join(self.root, subdir)):
+                for name in files:
+                    path = os.path.join(folder, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+store = DownloadStore()
@@ -0,0 +1,230 @@
+import re
+from urllib.parse import urlsplit
+
+from urls import registered_domain
+
+# Entities are found by linear scans instead of trying a complex pattern at
+# every position of the text. Emails are anchored on '@' (found with
+# str.find). Phone numbers and street addresses both start at a run of digits
+# and separators, found in one pass by NUMERIC_RUN_RE, which cannot backtrack.
+# Each candidate is then checked by a small validator.
+
+EMAIL_RE = re.compile(
+    r"(?<![\w.%+-])[A-Za-z0-9][A-Za-z0-9._%+-]{0,63}"
+    r"@(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.){1,8}[A-Za-z]{2,24}(?![\w-])")
+# Characters around an '@' that an address can span
+EMAIL_WINDOW_BEFORE = 64
+EMAIL_WINDOW_AFTER = 256
+# Retina image names such as logo@2x.png look like addresses
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp')
+
+NUMERIC_RUN_RE = re.compile(r"[+(\d][\d ().-]*")
+# Runs longer than this are rows of a table or long IDs, not phone numbers
+RUN_MAX_CHARS = 24
+# A run right after one of these is part of a word, path, decimal or range
+RUN_BLOCKED_BEFORE = frozenset('/_.,+-')
+
+# Accepted phone shapes: international (+ or 00 prefix), North American, and national with a trunk 0
+PHONE_SHAPES = [
+    re.compile(r"(?:\+|00)\d{1,3}(?:[ .-]?\(\d{1,4}\))?(?:[ .-]?\d{1,5}){1,6}"),
+    re.compile(r"(?:1[ .-]?)?(?:\(\d{3}\)[ .-]?|\d{3}[ .-])\d{3}[ .-]\d{4}"),
+    re.compile(r"(?:\(0\d{1,4}\)|0\d{1,4})(?:[ .-]\d{2,5}){1,4}"),
+]
+# The output of normalize_phone, as stored in page records
+NORMALIZED_PHONE_RE = re.compile(r"\+?\d{8,15}")
+# International numbers have at most 15 digits; fewer than 8 are extensions, prices or local numbers
+PHONE_MIN_DIGITS = 8
+PHONE_MAX_DIGITS = 15
+DATE_RE = re.compile(r"\d{4}[-./]\d{1,2}[-./]\d{1,2}|\d{1,2}[-./]\d{1,2}[-./]\d{2,4}|(?:19|20)\d\d[-/ ](?:19|20)\d\d")
+IP_ADDRESS_RE = re.compile(r"\d{1,3}(?:\.\d{1,3}){3}")
+# Amounts written with thousands separators, e.g. 12 345 678
+THOUSANDS_RE = re.compile(r"\d{1,3}(?:[ .]\d{3})+")
+NON_DIGITS_RE = re.compile(r"\D")
+# The national trunk prefix written into international numbers, as in +49 (0)30 ...; it is not dialled from abroad
+TRUNK_PREFIX_RE = re.compile(r"\(0\)")
+
+STREET_TYPES = ("Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Lane|Ln|Drive|Dr|Way|Court|Ct|Place|Pl|Square|Sq|"
+                "Parkway|Pkwy|Highway|Hwy|Terrace|Circle|Plaza|Strasse|Straße")
+# Matched only at the start of a numeric run that is followed by a capitalized word
+ADDRESS_RE = re.compile(rf"""
+    \d{{1,6}}[A-Za-z]?[ \t]+                                    # street number
+    (?:[A-Z][A-Za-z0-9.'-]{{0,30}}[ \t]+){{1,4}}?                # street name
+    (?:{STREET_TYPES})\b\.?
+    (?:,?[ \t]+(?:Suite|Ste|Floor|Fl|Unit|Room|\#)\.?[ \t]*[\w-]{{1,10}})?
+    (?:,[ \t]*[A-Z][A-Za-z .'-]{{1,40}}?,[ \t]*[A-Z]{{2}}[ \t]+\d{{5}}(?:-\d{{4}})?)?    # city, state ZIP
+""", re.VERBOSE)
+WHITESPACE_RE = re.compile(r"\s+")
+
+TWITTER_PATH_RE = re.compile(r"/@?(?!intent\b|share\b|home\b|search\b|hashtag\b|i/)([A-Za-z0-9_]{1,15})(?:[/?#]|$)")
+# One pattern per network, chosen by the link's registered domain so each link is matched once
+SOCIAL_PATTERNS = {
+    'linkedin.com': ('linkedin', re.compile(r"/(company|in|school|showcase)/([^/?#]+)")),
+    'twitter.com': ('twitter', TWITTER_PATH_RE),
+    'x.com': ('twitter', TWITTER_PATH_RE),
+    'facebook.com': ('facebook', re.compile(
+        r"/(?!sharer\b|share\b|dialog\b|plugins\b|login\b|groups/?$)([A-Za-z0-9.-]{3,50})(?:[/?#]|$)")),
+    'instagram.com': ('instagram', re.compile(r"/(?!p/|explore\b|accounts\b)([A-Za-z0-9_.]{1,30})(?:[/?#]|$)")),
+    'youtube.com': ('youtube', re.compile(r"/(?:(?:c|user|channel)/([\w-]{1,100})|@([\w.-]{1,100}))")),
+    'github.com': ('github', re.compile(
+        r"/(?!features\b|about\b|login\b|orgs\b|sponsors\b)([A-Za-z0-9-]{1,39})(?:[/?#]|$)")),
+    'tiktok.com': ('tiktok', re.compile(r"/@([\w.]{2,24})")),
+}
+
+def normalize_email(value):
+    value = value.strip('.').lower()
+    if value.endswith(IMAGE_SUFFIXES):
+        return None
+    return value
+
+def normalize_phone(value):
+    """E.164-style digits ('+' only if the number had a country prefix), or None if it is not a phone number."""
+    value = value.strip()
+    international = value.startswith(('+', '00'))
+    digits = NON_DIGITS_RE.sub('', TRUNK_PREFIX_RE.sub('', value) if international else value)
+    if value.startswith('00'):
+        digits = digits[2:]
+    if not PHONE_MIN_DIGITS <= len(digits) <= PHONE_MAX_DIGITS or len(set(digits)) == 1:
+        return None
+    if DATE_RE.fullmatch(value) or IP_ADDRESS_RE.fullmatch(value) or THOUSANDS_RE.fullmatch(value):
+        return None
+    if not any(shape.fullmatch(value) for shape in PHONE_SHAPES):
+        return None
+    return '+' + digits if international else digits
+
+def _renormalize_phone(value):
+    # Page records hold numbers normalize_phone already accepted
+    return value if NORMALIZED_PHONE_RE.fullmatch(value) else normalize_phone(value)
+
+def normalize_address(value):
+    return WHITESPACE_RE.sub(' ', value).strip(' ,.')
+
+def _unique(values, normalize):
+    seen = {}
+    for value in values:
+        value = normalize(value)
+        if value and value.casefold() not in seen:
+            seen[value.casefold()] = value
+    return list(seen.values())
+
+def find_emails(text):
+    found = []
+    at = text.find('@')
+    while at != -1:
+        resume = at + 1
+        for match in EMAIL_RE.finditer(text, max(0, at - EMAIL_WINDOW_BEFORE), at + EMAIL_WINDOW_AFTER):
+            if match.start() < at < match.end():
+                found.append(match.group())
+                resume = match.end()
+                break
+        at = text.find('@', resume)
+    return found
+
+def scan_numeric_runs(text):
+    """Phone number and street address candidates, from one pass over the runs of digits in the text."""
+    phones = []
+    addresses = []
+    for match in NUMERIC_RUN_RE.finditer(text):
+        start, end = match.span()
+        if start and (text[start - 1].isalnum() or text[start - 1] in RUN_BLOCKED_BEFORE):
+            continue
+        candidate = match.group().rstrip(' .-(')
+        following = text[start + len(candidate):start + len(candidate) + 1]
+        if len(candidate) <= 6 and candidate.isdigit():
+            # A street number is followed by a capitalized name, or by a letter as in 221B
+            if following.isalpha() or (following == ' ' and text[end:end + 1].isupper()):
+                address = ADDRESS_RE.match(text, start)
+                if address:
+                    addresses.append(address.group())
+            continue
+        if following.isalpha():
+            # Digits that run into a word, such as an ID
+            continue
+        if PHONE_MIN_DIGITS <= len(candidate) <= RUN_MAX_CHARS:
+            phones.append(candidate)
+    return phones, addresses
+
+def extract_emails(text):
+    if '@' not in text:
+        return []
+    return _unique(find_emails(text), normalize_email)
+
+def extract_phones(text):
+    return _unique(scan_numeric_runs(text)[0], normalize_phone)
+
+def extract_addresses(text):
+    return _unique(scan_numeric_runs(text)[1], normalize_address)
+
+def extract_entities(text):
+    phones, addresses = scan_numeric_runs(text)
+    return {
+        'emails': extract_emails(text),
+        'phones': _unique(phones, normalize_phone),
+        'addresses': _unique(addresses, normalize_address),
+    }
+
+def social_handle(url):
+    """(network, handle, profile URL) for a link to a social profile, or None."""
+    entry = SOCIAL_PATTERNS.get(registered_domain(url))
+    if entry is None:
+        return None
+    network, pattern = entry
+    match = pattern.match(urlsplit(url).path)
+    if match is None:
+        return None
+    if network == 'linkedin':
+        handle = f"{match.group(1)}/{match.group(2)}".lower()
+        return network, handle, f"https://www.linkedin.com/{handle}"
+    handle = next(group for group in match.groups() if group).lower()
+    if network == 'youtube':
+        return network, handle, f"https://www.youtube.com/{match.group().lstrip('/')}"
+    if network == 'tiktok':
+        return network, handle, f"https://www.tiktok.com/@{handle}"
+    return network, handle, f"https://{registered_domain(url)}/{handle}"
+
+def company_entities(pages, documents=()):
+    """Deduplicated, normalized contact details and social profiles found across a crawl.
+
+    Page records already carry the matches from their parse. Document text is
+    scanned here in one pass over all documents joined together, and social
+    profiles come from every page's URL and links.
+    """
+    document_text = "\n\n".join(doc.get('content') or '' for doc in documents)
+    found = extract_entities(document_text)
+    social = {}
+    for page in pages:
+        for url in [page.get('url', '')] + list(page.get('links', ())):
+            profile = social_handle(url)
+            if profile and profile[:2] not in social:
+                social[profile[:2]] = {'network': profile[0], 'handle': profile[1], 'url': profile[2]}
+    return {
+        'emails': _unique([e for page in pages for e in page.get('emails', ())] + found['emails'], normalize_email),
+        'phones': _unique([p for page in pages for p in page.get('phones', ())] + found['phones'],
+                          _renormalize_phone),
+        'addresses': _unique([a for page in pages for a in page.get('addresses', ())] + found['addresses'],
+                             normalize_address),
+        'social': list(social.values()),
+    }
+
+def seed_entities(url):
+    """Entities of a seed that is not the company's own site: only the social profile its URL points at.
+
+    Search results, directories and other companies' pages list contacts and
+    profiles that are not the company's, so their text and links are not used.
+    """
+    profile = social_handle(url)
+    social = [{'network': profile[0], 'handle': profile[1], 'url': profile[2]}] if profile else []
+    return {'emails': [], 'phones': [], 'addresses': [], 'social': social}
+
+def merge_entities(entity_sets):
+    """Combine the company_entities() of several sites of one company."""
+    entity_sets = list(entity_sets)
+    social = {}
+    for entities in entity_sets:
+        for profile in entities.get('social', ()):
+            social.setdefault((profile['network'], profile['handle']), profile)
+    return {
+        'emails': _unique((e for s in entity_sets for e in s.get('emails', ())), normalize_email),
+        'phones': _unique((p for s in entity_sets for p in s.get('phones', ())), _renormalize_phone),
+        'addresses': _unique((a for s in entity_sets for a in s.get('addresses', ())), normalize_address),
+        'social': list(social.values()),
+    }
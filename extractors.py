@@ -0,0 +1,276 @@
+"""Document text extractors, registered by MIME type.
+
+The format is detected from magic bytes first, then from the declared
+Content-Type, then from the file extension. Each backend library (PyMuPDF,
+python-docx, openpyxl, python-pptx, lxml) is imported the first time a
+document of its format is extracted, not when this module is imported.
+Adding a format is one function decorated with @register.
+"""
+import csv
+import logging
+import os
+import zipfile
+from xml.etree import ElementTree
+
+# Limits that keep one huge document from exhausting the container's memory
+MAX_DOCUMENT_PAGES = int(os.getenv("MAX_DOCUMENT_PAGES", "300"))
+MAX_DOCUMENT_ROWS = int(os.getenv("MAX_DOCUMENT_ROWS", "50000"))
+MAX_DOCUMENT_CHARS = int(os.getenv("MAX_DOCUMENT_CHARS", str(2 * 1024 * 1024)))
+
+PDF = 'application/pdf'
+DOCX = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+PPTX = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+ODT = 'application/vnd.oasis.opendocument.text'
+ODS = 'application/vnd.oasis.opendocument.spreadsheet'
+ODP = 'application/vnd.oasis.opendocument.presentation'
+TXT = 'text/plain'
+CSV = 'text/csv'
+HTML = 'text/html'
+
+# Member files that identify Office Open XML packages
+OOXML_MARKERS = [('word/document.xml', DOCX), ('xl/workbook.xml', XLSX), ('ppt/presentation.xml', PPTX)]
+
+EXTRACTORS = {}        # MIME type -> extractor function
+EXTENSIONS = {}        # file extension -> MIME type
+MIME_EXTENSIONS = {}   # MIME type -> preferred file extension
+
+def register(mime_type, extensions, aliases=()):
+    """Register an extractor function for a MIME type, its aliases and file extensions."""
+    def decorator(func):
+        for name in (mime_type,) + tuple(aliases):
+            EXTRACTORS[name] = func
+        for ext in extensions:
+            EXTENSIONS[ext] = mime_type
+        MIME_EXTENSIONS[mime_type] = extensions[0]
+        return func
+    return decorator
+
+def join_text_chunks(chunks, separator=''):
+    """Join text chunks from an extractor generator, stopping at MAX_DOCUMENT_CHARS."""
+    parts = []
+    size = 0
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            size += len(chunk) + len(separator)
+            if size > MAX_DOCUMENT_CHARS:
+                text = separator.join(parts)[:MAX_DOCUMENT_CHARS]
+                return text + f"\n[Truncated after {MAX_DOCUMENT_CHARS} characters]"
+    finally:
+        # Closes the generator early on truncation so it releases its file
+        chunks.close()
+    return separator.join(parts)
+
+def iter_text_from_pdf(path):
+    import fitz  # PyMuPDF
+    with fitz.open(path) as doc:
+        for page_number in range(min(doc.page_count, MAX_DOCUMENT_PAGES)):
+            yield doc.load_page(page_number).get_text()
+        if doc.page_count > MAX_DOCUMENT_PAGES:
+            yield f"\n[Truncated after {MAX_DOCUMENT_PAGES} of {doc.page_count} pages]"
+
+def iter_text_from_docx(path):
+    import docx
+    for p in docx.Document(path).paragraphs:
+        yield p.text
+
+def iter_text_from_xlsx(path):
+    import openpyxl
+    # read_only streams rows from the sheet XML instead of building every cell in memory
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = 0
+        for ws in wb.worksheets:
+            for row in ws.iter_rows(values_only=True):
+                if rows >= MAX_DOCUMENT_ROWS:
+                    yield f"[Truncated after {MAX_DOCUMENT_ROWS} rows]"
+                    return
+                rows += 1
+                yield '\t'.join([str(cell) if cell is not None else '' for cell in row])
+    finally:
+        wb.close()
+
+def iter_text_from_pptx(path):
+    import pptx
+    prs = pptx.Presentation(path)
+    for number, slide in enumerate(prs.slides):
+        if number >= MAX_DOCUMENT_PAGES:
+            yield f"[Truncated after {MAX_DOCUMENT_PAGES} slides]"
+            return
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                yield shape.text
+
+def iter_text_from_txt(path):
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        while True:
+            chunk = f.read(64 * 1024)
+            if not chunk:
+                return
+            yield chunk
+
+def iter_text_from_csv(path):
+    with open(path, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+        try:
+            dialect = csv.Sniffer().sniff(f.read(8192))
+        except csv.Error:
+            dialect = csv.excel
+        f.seek(0)
+        for number, row in enumerate(csv.reader(f, dialect)):
+            if number >= MAX_DOCUMENT_ROWS:
+                yield f"[Truncated after {MAX_DOCUMENT_ROWS} rows]"
+                return
+            yield '\t'.join(row)
+
+def iter_text_from_html(path):
+    from lxml import etree
+    root = etree.parse(path, etree.HTMLParser(recover=True)).getroot()
+    if root is None:
+        return
+    etree.strip_elements(root, 'script', 'style', 'template', with_tail=False)
+    for text in root.itertext():
+        text = text.strip()
+        if text:
+            yield text
+
+def iter_text_from_odf(path):
+    # OpenDocument text, spreadsheets and presentations keep their text in content.xml
+    text_ns = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+    with zipfile.ZipFile(path) as zf, zf.open('content.xml') as f:
+        for _, el in ElementTree.iterparse(f):
+            if el.tag in (text_ns + 'p', text_ns + 'h'):
+                yield ''.join(el.itertext())
+                el.clear()
+
+@register(PDF, ['.pdf'])
+def extract_text_from_pdf(path):
+    try:
+        return join_text_chunks(iter_text_from_pdf(path))
+    except Exception as e:
+        logging.error(f"PDF extraction error for {path}: {e}")
+        return f"[PDF extraction error: {e}]"
+
+@register(DOCX, ['.docx'])
+def extract_text_from_docx(path):
+    try:
+        return join_text_chunks(iter_text_from_docx(path), '\n')
+    except Exception as e:
+        logging.error(f"DOCX extraction error for {path}: {e}")
+        return f"[DOCX extraction error: {e}]"
+
+@register(XLSX, ['.xlsx'])
+def extract_text_from_xlsx(path):
+    try:
+        return join_text_chunks(iter_text_from_xlsx(path), '\n')
+    except Exception as e:
+        logging.error(f"XLSX extraction error for {path}: {e}")
+        return f"[XLSX extraction error: {e}]"
+
+@register(PPTX, ['.pptx'])
+def extract_text_from_pptx(path):
+    try:
+        return join_text_chunks(iter_text_from_pptx(path), '\n')
+    except Exception as e:
+        logging.error(f"PPTX extraction error for {path}: {e}")
+        return f"[PPTX extraction error: {e}]"
+
+@register(TXT, ['.txt'])
+def extract_text_from_txt(path):
+    try:
+        return join_text_chunks(iter_text_from_txt(path))
+    except Exception as e:
+        logging.error(f"TXT extraction error for {path}: {e}")
+        return f"[TXT extraction error: {e}]"
+
+@register(CSV, ['.csv'], aliases=['application/csv', 'text/comma-separated-values'])
+def extract_text_from_csv(path):
+    try:
+        return join_text_chunks(iter_text_from_csv(path), '\n')
+    except Exception as e:
+        logging.error(f"CSV extraction error for {path}: {e}")
+        return f"[CSV extraction error: {e}]"
+
+@register(HTML, ['.html', '.htm'], aliases=['application/xhtml+xml'])
+def extract_text_from_html(path):
+    try:
+        return join_text_chunks(iter_text_from_html(path), '\n')
+    except Exception as e:
+        logging.error(f"HTML extraction error for {path}: {e}")
+        return f"[HTML extraction error: {e}]"
+
+@register(ODT, ['.odt'])
+@register(ODS, ['.ods'])
+@register(ODP, ['.odp'])
+def extract_text_from_odf(path):
+    try:
+        return join_text_chunks(iter_text_from_odf(path), '\n')
+    except Exception as e:
+        logging.error(f"ODF extraction error for {path}: {e}")
+        return f"[ODF extraction error: {e}]"
+
+# Extensions that mark a link as a document to download; .html links are pages to crawl
+DOCUMENT_EXTENSIONS = [ext for ext, mime_type in EXTENSIONS.items() if mime_type != HTML]
+# Declared Content-Types of documents; a download link answering with HTML led to a page instead
+DOCUMENT_MIME_TYPES = frozenset(name for name, func in EXTRACTORS.items() if func is not EXTRACTORS[HTML])
+
+def _sniff_zip(path):
+    try:
+        with zipfile.ZipFile(path) as zf:
+            names = set(zf.namelist())
+            if 'mimetype' in names:
+                declared = zf.read('mimetype').decode('ascii', errors='ignore').strip()
+                if declared in EXTRACTORS:
+                    return declared
+            for marker, mime_type in OOXML_MARKERS:
+                if marker in names:
+                    return mime_type
+    except (zipfile.BadZipFile, OSError):
+        pass
+    return None
+
+def _looks_like_text(head):
+    if b'\x00' in head:
+        return False
+    try:
+        # Ignore a multi-byte character cut off at the end of the sample
+        head[:-4].decode('utf-8')
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def normalize_content_type(content_type):
+    return (content_type or '').split(';')[0].strip().lower()
+
+def sniff_mime_type(path, content_type=None):
+    """Detect a document's MIME type from magic bytes, the declared Content-Type, then the extension."""
+    with open(path, 'rb') as f:
+        head = f.read(2048)
+    if head.startswith(b'%PDF-'):
+        return PDF
+    if head.startswith(b'PK\x03\x04'):
+        mime_type = _sniff_zip(path)
+        if mime_type:
+            return mime_type
+    declared = normalize_content_type(content_type)
+    if declared in EXTRACTORS:
+        return declared
+    ext = os.path.splitext(path)[1].lower()
+    if ext in EXTENSIONS:
+        return EXTENSIONS[ext]
+    if _looks_like_text(head):
+        start = head.lstrip(b'\xef\xbb\xbf \t\r\n')[:15].lower()
+        return HTML if start.startswith((b'<!doctype html', b'<html')) else TXT
+    return declared or None
+
+def extension_for(content_type, url_ext=''):
+    """File extension to store a download under: the URL's if it is known, else one for its Content-Type."""
+    if url_ext in EXTENSIONS:
+        return url_ext
+    return MIME_EXTENSIONS.get(normalize_content_type(content_type), url_ext)
+
+def extract_document_text(path, content_type=None):
+    extractor = EXTRACTORS.get(sniff_mime_type(path, content_type))
+    if extractor is None:
+        return '[Unknown document type]'
+    return extractor(path)
@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Per-URL fingerprints from earlier crawls, used by incremental re-crawls
+FINGERPRINT_DB = os.getenv("FINGERPRINT_DB", os.path.join("data", "fingerprints.sqlite3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    sitemap_lastmod TEXT,
+    record TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    checked_at REAL NOT NULL
+)
+"""
+
+class FingerprintStore:
+    """SQLite table of each crawled URL's content hash, validators and last extracted page record.
+
+    Every process on the machine shares the file, so a call can wait for
+    another's write lock; async code runs the methods with asyncio.to_thread,
+    and each thread gets its own connection.
+    """
+
+    def __init__(self, path=FINGERPRINT_DB):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            # check_same_thread=False only so close() can close every thread's connection
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(SCHEMA)
+            self._local.db = db
+            with self._lock:
+                self._connections.append(db)
+        return db
+
+    def get(self, url):
+        row = self._connect().execute(
+            "SELECT content_hash, etag, last_modified, sitemap_lastmod, record, fetched_at FROM pages WHERE url = ?",
+            (url,)).fetchone()
+        if row is None:
+            return None
+        try:
+            record = json.loads(row[4])
+        except ValueError:
+            logging.warning(f"Discarding unreadable fingerprint for {url}")
+            return None
+        return {'content_hash': row[0], 'etag': row[1], 'last_modified': row[2],
+                'sitemap_lastmod': row[3], 'record': record, 'fetched_at': row[5]}
+
+    def conditional_headers(self, fingerprint):
+        headers = {}
+        if fingerprint and fingerprint['etag']:
+            headers['If-None-Match'] = fingerprint['etag']
+        if fingerprint and fingerprint['last_modified']:
+            headers['If-Modified-Since'] = fingerprint['last_modified']
+        return headers
+
+    def put(self, url, content_hash, headers, record, sitemap_lastmod=None):
+        """Store the fingerprint and page record of a page that was fetched and parsed."""
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, content_hash, headers.get('ETag'), headers.get('Last-Modified'), sitemap_lastmod,
+                 json.dumps(record), now, now))
+
+    def touch(self, url, headers=None, sitemap_lastmod=None):
+        """Mark an unchanged page as checked, keeping any newer validators or sitemap lastmod."""
+        headers = headers or {}
+        with self._connect() as db:
+            db.execute(
+                "UPDATE pages SET checked_at = ?, etag = COALESCE(?, etag), "
+                "last_modified = COALESCE(?, last_modified), sitemap_lastmod = COALESCE(?, sitemap_lastmod) "
+                "WHERE url = ?",
+                (time.time(), headers.get('ETag'), headers.get('Last-Modified'), sitemap_lastmod, url))
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for db in connections:
+            db.close()
+        self._local = threading.local()
+
+store = FingerprintStore()
@@ -0,0 +1,125 @@
+import datetime
+import logging
+import os
+import re
+import time
+import urllib.robotparser
+from urllib.parse import urlparse
+
+from lxml import etree
+
+from urls import canonicalize_url
+
+# Subpages that usually describe the company; google_search_urls seeds them too
+VALUABLE_PATHS = ['/about', '/about-us', '/company', '/team', '/contact', '/products',
+                  '/services', '/blog', '/news', '/careers', '/jobs']
+
+PRIORITY_KEYWORDS = frozenset(
+    [word for path in VALUABLE_PATHS for word in re.split(r'[^a-z0-9]+', path) if word]
+    + ['leadership', 'management', 'founders', 'people', 'board', 'investors', 'investor', 'press',
+       'media', 'history', 'mission', 'customers', 'partners', 'locations', 'offices', 'overview'])
+LOW_VALUE_KEYWORDS = frozenset(['privacy', 'terms', 'legal', 'cookie', 'cookies', 'imprint', 'disclaimer',
+                                'login', 'signin', 'signup', 'register', 'account', 'cart', 'checkout',
+                                'tag', 'tags', 'category', 'author', 'feed', 'search', 'wp', 'json'])
+
+# Whether to skip URLs that robots.txt disallows
+RESPECT_ROBOTS = os.getenv("RESPECT_ROBOTS", "true").lower() not in ("0", "false", "no")
+# Caps on how much of a site's sitemaps is read into the frontier
+MAX_SITEMAP_FILES = int(os.getenv("MAX_SITEMAP_FILES", "5"))
+MAX_SITEMAP_URLS = int(os.getenv("MAX_SITEMAP_URLS", "1000"))
+# Sitemap files larger than this are skipped without being read in full
+MAX_SITEMAP_BYTES = int(os.getenv("MAX_SITEMAP_BYTES", str(10 * 1024 * 1024)))
+# robots.txt and sitemaps are read once per origin per this many seconds
+SITE_HINTS_TTL = int(os.getenv("SITE_HINTS_TTL", "3600"))
+# Origins whose robots.txt and sitemaps are kept in memory at once
+SITE_HINTS_MAX_ORIGINS = int(os.getenv("SITE_HINTS_MAX_ORIGINS", "1000"))
+
+SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+def parse_lastmod(value):
+    """Parse a sitemap <lastmod> (W3C datetime) into a Unix timestamp, or None."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+def score_url(url, depth, lastmod=None):
+    """Crawl priority of a URL; lower scores are fetched first.
+
+    Shallow pages, short paths and paths naming company information come
+    first; legal, login and listing pages come last. Sitemap entries modified
+    recently get a small boost.
+    """
+    path = urlparse(url).path.lower()
+    words = set(re.split(r'[^a-z0-9]+', path))
+    score = depth * 10 + path.rstrip('/').count('/')
+    if words & PRIORITY_KEYWORDS:
+        score -= 15
+    if words & LOW_VALUE_KEYWORDS:
+        score += 15
+    modified = parse_lastmod(lastmod)
+    if modified is not None:
+        age_days = (time.time() - modified) / 86400
+        if age_days <= 30:
+            score -= 5
+        elif age_days <= 365:
+            score -= 2
+    return score
+
+def parse_robots(text):
+    rules = urllib.robotparser.RobotFileParser()
+    rules.parse(text.splitlines())
+    return rules
+
+def parse_sitemap(text):
+    """Return ([(url, lastmod)], [child sitemap urls]) from a sitemap or sitemap index."""
+    try:
+        root = etree.fromstring(text.encode('utf-8'), etree.XMLParser(recover=True, resolve_entities=False))
+    except etree.XMLSyntaxError as e:
+        logging.warning(f"Unreadable sitemap: {e}")
+        return [], []
+    if root is None:
+        return [], []
+    urls = []
+    children = []
+    # Namespaced and un-namespaced sitemaps are both common
+    for tag in (SITEMAP_NS, ''):
+        for entry in root.iter(tag + 'url'):
+            loc = entry.findtext(tag + 'loc')
+            if loc:
+                urls.append((loc.strip(), entry.findtext(tag + 'lastmod')))
+        for entry in root.iter(tag + 'sitemap'):
+            loc = entry.findtext(tag + 'loc')
+            if loc:
+                children.append(loc.strip())
+    return urls, children
+
+class SiteHints:
+    """What robots.txt and the sitemaps say about one origin."""
+
+    def __init__(self, rules=None, sitemap_urls=None):
+        self.rules = rules
+        # URL -> <lastmod> string (or None) for every URL listed in the sitemaps
+        self.sitemap_urls = sitemap_urls or {}
+        # The same by canonical URL, for links that differ from the sitemap entry only in form
+        self._lastmods = {canonicalize_url(url): lastmod for url, lastmod in self.sitemap_urls.items()}
+        self.expires_at = time.monotonic() + SITE_HINTS_TTL
+
+    def lastmod(self, url):
+        """The sitemap <lastmod> of a URL, or None if it has none or is not in the sitemaps."""
+        return self._lastmods.get(canonicalize_url(url))
+
+    def allowed(self, url, user_agent):
+        if not RESPECT_ROBOTS or self.rules is None:
+            return True
+        return self.rules.can_fetch(user_agent, url)
+
+    def crawl_delay(self, user_agent):
+        if self.rules is None:
+            return None
+        return self.rules.crawl_delay(user_agent)
@@ -0,0 +1,69 @@
+import contextlib
+import os
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connection pool settings, shared by the crawler, document downloads and the API process
+HTTP_CONNECTION_LIMIT = int(os.getenv("HTTP_CONNECTION_LIMIT", "100"))
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", "10"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_PAGE_TIMEOUT = float(os.getenv("HTTP_PAGE_TIMEOUT", "15"))
+HTTP_DOWNLOAD_TIMEOUT = float(os.getenv("HTTP_DOWNLOAD_TIMEOUT", "30"))
+
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+PAGE_TIMEOUT = aiohttp.ClientTimeout(total=HTTP_PAGE_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=HTTP_DOWNLOAD_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+_session = None
+_sync_session = None
+
+def create_session(**kwargs):
+    """Create an aiohttp session with pooled keep-alive connections and DNS caching."""
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_CONNECTION_LIMIT,
+        limit_per_host=HTTP_LIMIT_PER_HOST,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=PAGE_TIMEOUT, headers=DEFAULT_HEADERS, **kwargs)
+
+async def start():
+    """Open the process-wide session. Called once at API startup."""
+    global _session
+    if _session is None or _session.closed:
+        _session = create_session()
+    return _session
+
+async def close():
+    """Close the process-wide session. Called once at API shutdown."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+@contextlib.asynccontextmanager
+async def get_session(session=None):
+    """Yield the given session, the process-wide one, or a temporary one for standalone runs."""
+    if session is not None:
+        yield session
+    elif _session is not None and not _session.closed:
+        yield _session
+    else:
+        async with create_session() as temp_session:
+            yield temp_session
+
+def get_sync_session():
+    """Return the process-wide requests session used by the synchronous crawl paths."""
+    global _sync_session
+    if _sync_session is None:
+        adapter = HTTPAdapter(pool_connections=HTTP_CONNECTION_LIMIT, pool_maxsize=HTTP_LIMIT_PER_HOST)
+        _sync_session = requests.Session()
+        _sync_session.headers.update(DEFAULT_HEADERS)
+        _sync_session.mount("http://", adapter)
+        _sync_session.mount("https://", adapter)
+    return _sync_session
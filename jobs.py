@@ -0,0 +1,354 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+import uuid
+
+import shared_state
+from query_cache import normalize_query
+
+# How many research crawls run at once, and how many more may wait for a worker
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "20"))
+# Finished jobs are forgotten after this many seconds
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "3600"))
+# Shared mode: seconds a crawl worker holds a job without renewing it, and how often the queue is polled
+JOB_LEASE = float(os.getenv("JOB_LEASE", "60"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+
+class QueueFullError(Exception):
+    pass
+
+class Job:
+    def __init__(self, query, incremental=False):
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.incremental = incremental
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {}
+        self.result = None
+        self.error = None
+        # Context of a request waiting on the job, so the run adds to that request's timing breakdown
+        self.context = None
+
+    def update_progress(self, update):
+        self.progress.update(update)
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(data["query"], data.get("incremental", False))
+        job.id = data["job_id"]
+        job.status = data["status"]
+        job.created_at = data["created_at"]
+        job.started_at = data.get("started_at")
+        job.finished_at = data.get("finished_at")
+        job.progress = data.get("progress") or {}
+        job.error = data.get("error")
+        job.result = data.get("result")
+        return job
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "query": self.query,
+            "incremental": self.incremental,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": self.progress,
+            "error": self.error,
+        }
+
+class WorkerSlot:
+    """A place in the job queue that holds the worker reaching it until released.
+
+    Used for crawls the caller runs itself, such as a streamed one, so they
+    count against the same workers and queue as jobs.
+    """
+
+    def __init__(self):
+        self._granted = asyncio.get_running_loop().create_future()
+        self._released = asyncio.Event()
+
+    async def acquire(self):
+        """Wait until a worker reaches this slot."""
+        await self._granted
+
+    def release(self):
+        self._released.set()
+
+    async def _hold(self):
+        if self._released.is_set() or self._granted.done():
+            # The caller gave up while the slot was queued
+            return
+        self._granted.set_result(None)
+        await self._released.wait()
+
+class JobManager:
+    """Bounded queue of research jobs drained by a fixed pool of worker tasks.
+
+    Every crawl the API runs goes through it: queued jobs, requests waiting
+    on a result (submit_and_wait) and streamed crawls (reserve_slot). With a `store` (a checkpoints.CheckpointStore), every job is saved when
+    its status changes, in a thread. On start, finished jobs are reloaded and jobs that
+    were queued or running when the process stopped are queued again.
+    """
+
+    def __init__(self, run, workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE, retention=JOB_RETENTION, store=None):
+        self.run = run
+        self.workers = workers
+        self.queue_size = queue_size
+        self.retention = retention
+        self.store = store
+        self.jobs = {}
+        self._queue = None
+        self._tasks = []
+        self._done = {}
+
+    async def start(self):
+        # Unbounded so resumed jobs always fit; submit() enforces queue_size for new ones
+        self._queue = asyncio.Queue()
+        if self.store:
+            self._restore()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, query, incremental=False, context=None):
+        """Queue a job; `context` is the contextvars.Context to run it in (see submit_and_wait)."""
+        await self._prune()
+        self._check_queue()
+        job = Job(query, incremental)
+        job.context = context
+        self._queue.put_nowait(job)
+        self.jobs[job.id] = job
+        await self._save(job)
+        return job
+
+    async def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def submit_and_wait(self, query, incremental=False):
+        """Run a query on a job worker and return its result, joining an identical job already queued or running."""
+        job = None
+        if isinstance(query, str):
+            key = normalize_query(query)
+            job = next((j for j in self.jobs.values() if isinstance(j.query, str) and not j.finished_at
+                        and normalize_query(j.query) == key), None)
+        if job is None:
+            job = await self.submit(query, incremental, context=contextvars.copy_context())
+        if not job.finished_at:
+            await self._done.setdefault(job.id, asyncio.Event()).wait()
+        if job.status == "failed":
+            raise RuntimeError(job.error)
+        return job.result
+
+    def reserve_slot(self):
+        """Queue a WorkerSlot for a crawl the caller runs itself; raises QueueFullError like submit()."""
+        self._check_queue()
+        slot = WorkerSlot()
+        self._queue.put_nowait(slot)
+        return slot
+
+    def _check_queue(self):
+        if self._queue.qsize() >= self.queue_size:
+            raise QueueFullError(f"Job queue is full ({self.queue_size} jobs waiting)")
+
+    async def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [j.id for j in self.jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self.jobs[job_id]
+            if self.store:
+                await asyncio.to_thread(self.store.delete_job, job_id)
+
+    async def _save(self, job):
+        if not self.store:
+            return
+        state = job.to_dict()
+        # A copy, since the running crawl keeps updating its progress while the write runs
+        state["progress"] = dict(job.progress)
+        state["result"] = job.result
+        try:
+            await asyncio.to_thread(self.store.save_job, job.id, state)
+        except Exception as e:
+            logging.warning(f"Could not save research job {job.id}: {e}")
+
+    def _restore(self):
+        cutoff = time.time() - self.retention
+        for state in self.store.load_jobs():
+            job = Job.from_dict(state)
+            if job.finished_at:
+                if job.finished_at < cutoff:
+                    self.store.delete_job(job.id)
+                    continue
+            else:
+                logging.info(f"Resuming research job {job.id} ({job.status} when the process stopped)")
+                job.status = "queued"
+                job.started_at = None
+                self._queue.put_nowait(job)
+            self.jobs[job.id] = job
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if isinstance(job, WorkerSlot):
+                    await job._hold()
+                else:
+                    await self._run_job(job)
+            except Exception as e:
+                # A failing store call must not end the worker and leave fewer than JOB_WORKERS running
+                logging.error(f"Job worker error: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job):
+        job.status = "running"
+        job.started_at = time.time()
+        await self._save(job)
+        try:
+            run = self.run(job)
+            if job.context is not None:
+                run = job.context.run(asyncio.ensure_future, run)
+            job.result = await run
+            job.status = "completed"
+        except Exception as e:
+            logging.error(f"Research job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        # A job cancelled by stop() never gets here and stays saved as unfinished
+        job.finished_at = time.time()
+        await self._save(job)
+        done = self._done.pop(job.id, None)
+        if done:
+            done.set()
+        if self.store:
+            # The result is saved with the job; its crawl checkpoints are no longer needed
+            await asyncio.to_thread(self.store.delete_sites, job.id)
+
+class SharedJobManager:
+    """Job queue kept in a shared backend (see shared_state) and drained by any number of processes.
+
+    API processes run it with workers=0: they only submit jobs and read their
+    state. Crawl worker processes (worker.py) run `workers` tasks each that
+    claim jobs, renew their lease while running them and save the result. A
+    job whose worker dies is claimed again once its lease expires and resumes
+    from its checkpoints; `store` (a checkpoints.CheckpointStore) is where a
+    finished job's crawl checkpoints are deleted. Backend calls run in
+    threads, so a locked database never blocks the event loop.
+    """
+
+    def __init__(self, run, backend, workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE, retention=JOB_RETENTION,
+                 lease=JOB_LEASE, worker_id=None, store=None):
+        self.run = run
+        self.backend = backend
+        self.store = store
+        self.workers = workers
+        self.queue_size = queue_size
+        self.retention = retention
+        self.lease = lease
+        self.worker_id = worker_id or shared_state.WORKER_ID
+        self._tasks = []
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, query, incremental=False):
+        await asyncio.to_thread(self.backend.prune, self.retention)
+        if await asyncio.to_thread(self.backend.queued_count) >= self.queue_size:
+            raise QueueFullError(f"Job queue is full ({self.queue_size} jobs waiting)")
+        job = Job(query, incremental)
+        query_key = normalize_query(query) if isinstance(query, str) else None
+        await asyncio.to_thread(self.backend.submit_job, job.to_dict(), query_key)
+        return job
+
+    async def get(self, job_id):
+        state = await asyncio.to_thread(self.backend.get_job, job_id)
+        return Job.from_dict(state) if state else None
+
+    async def submit_and_wait(self, query, incremental=False):
+        """Run a query on a crawl worker and return its result, joining an identical job already queued or running."""
+        job_id = None
+        if isinstance(query, str):
+            job_id = await asyncio.to_thread(self.backend.find_active_job, normalize_query(query))
+        if job_id is None:
+            job_id = (await self.submit(query, incremental)).id
+        while True:
+            job = await self.get(job_id)
+            if job is None:
+                raise RuntimeError(f"Job {job_id} disappeared from the queue")
+            if job.status == "completed":
+                return job.result
+            if job.status == "failed":
+                raise RuntimeError(job.error)
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    async def _worker(self):
+        while True:
+            try:
+                state = await asyncio.to_thread(self.backend.claim_job, self.worker_id, self.lease)
+                if state is None:
+                    await asyncio.sleep(JOB_POLL_INTERVAL)
+                    continue
+                await self._run_job(Job.from_dict(state))
+            except Exception as e:
+                # e.g. the database is still locked after its timeout; an unfinished job's lease expires
+                # and it is claimed again, so keep this worker polling rather than let it end
+                logging.error(f"Crawl worker {self.worker_id} error: {e}")
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    async def _run_job(self, job):
+        run_task = asyncio.ensure_future(self.run(job))
+        heartbeat = asyncio.create_task(self._heartbeat(job, run_task))
+        try:
+            job.result = await run_task
+            job.status = "completed"
+        except asyncio.CancelledError:
+            if heartbeat.done():
+                logging.warning(f"Research job {job.id} was taken over by another worker")
+                return
+            # This worker is stopping; another one picks the job up from its checkpoints.
+            # Inline, since awaiting here could be interrupted by a second cancel
+            self.backend.release_job(job.id, self.worker_id)
+            raise
+        except Exception as e:
+            logging.error(f"Research job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            heartbeat.cancel()
+            run_task.cancel()
+        job.finished_at = time.time()
+        state = job.to_dict()
+        state["result"] = job.result
+        if await asyncio.to_thread(self.backend.finish_job, state, self.worker_id) and self.store:
+            # The result is saved with the job; its crawl checkpoints are no longer needed
+            await asyncio.to_thread(self.store.delete_sites, job.id)
+
+    async def _heartbeat(self, job, run_task):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                renewed = await asyncio.to_thread(self.backend.renew_job, job.id, self.worker_id, self.lease,
+                                                  dict(job.progress))
+            except Exception as e:
+                logging.warning(f"Could not renew the lease of research job {job.id}: {e}")
+                continue
+            if not renewed:
+                # The lease expired and another worker claimed the job; stop duplicating its work
+                run_task.cancel()
+                return
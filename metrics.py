@@ -0,0 +1,74 @@
+import contextlib
+import contextvars
+import time
+from urllib.parse import urlparse
+
+from prometheus_client import Counter, Gauge, Histogram
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+FETCH_SECONDS = Histogram('scraper_fetch_seconds', 'HTTP request latency by host', ['host'],
+                          buckets=LATENCY_BUCKETS)
+FETCH_RESPONSES = Counter('scraper_fetch_responses_total', 'HTTP responses by status code ("error" for failures)',
+                          ['status'])
+DOWNLOADED_BYTES = Counter('scraper_downloaded_bytes_total', 'Response body bytes received', ['kind'])
+PARSE_SECONDS = Histogram('scraper_parse_seconds', 'HTML parse and extraction time per page, including pool queueing',
+                          buckets=LATENCY_BUCKETS)
+EXTRACTION_SECONDS = Histogram('scraper_document_extraction_seconds', 'Document text extraction time by format',
+                               ['format'], buckets=LATENCY_BUCKETS)
+WAIT_SECONDS = Histogram('scraper_wait_seconds', 'Time spent waiting for a per-host slot or a request slot',
+                         ['stage'], buckets=LATENCY_BUCKETS)
+FRONTIER_URLS = Gauge('scraper_frontier_urls', 'URLs queued in the frontiers of running crawls')
+ACTIVE_CRAWLS = Gauge('scraper_active_crawls', 'Site crawls in progress')
+
+# Per-request timing breakdown, set by timing_breakdown() and shared by every task the request starts
+_breakdown = contextvars.ContextVar('timing_breakdown', default=None)
+
+def host_of(url):
+    return urlparse(url).netloc.lower()
+
+def add_timing(stage, seconds):
+    """Add time spent in a stage to the current request's breakdown, if one is being collected."""
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        breakdown[stage] = breakdown.get(stage, 0.0) + seconds
+
+@contextlib.contextmanager
+def timing_breakdown():
+    """Collect the seconds spent per stage by the code run inside this block.
+
+    Concurrent work adds up, so stage totals can exceed the wall time, which
+    is reported as 'total'.
+    """
+    breakdown = {}
+    token = _breakdown.set(breakdown)
+    started = time.perf_counter()
+    try:
+        yield breakdown
+    finally:
+        breakdown['total'] = time.perf_counter() - started
+        _breakdown.reset(token)
+
+def record_wait(stage, seconds):
+    WAIT_SECONDS.labels(stage).observe(seconds)
+    add_timing('wait_' + stage, seconds)
+
+def record_fetch(url, status, seconds, kind, size=0):
+    """Record one finished HTTP request; status None means it failed without a response."""
+    FETCH_SECONDS.labels(host_of(url)).observe(seconds)
+    FETCH_RESPONSES.labels(str(status) if status is not None else 'error').inc()
+    if size:
+        DOWNLOADED_BYTES.labels(kind).inc(size)
+    add_timing('fetch_' + kind, seconds)
+
+@contextlib.contextmanager
+def timed(stage, histogram=None):
+    """Time a block into a histogram (labels already applied) and the request breakdown."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if histogram is not None:
+            histogram.observe(elapsed)
+        add_timing(stage, elapsed)
@@ -0,0 +1,102 @@
+import asyncio
+import email.utils
+import os
+import time
+from urllib.parse import urlparse
+
+# Processes crawling at once on every machine (the crawl workers when SHARED_BACKEND is set). Each paces
+# hosts on its own, so the per-host rates and burst below are split evenly between them
+CRAWL_PROCESSES = max(1, int(os.getenv("CRAWL_PROCESSES", "1")))
+# Per-host request rates (requests/second). Each host starts at HOST_RATE and adapts
+# between HOST_MIN_RATE and HOST_MAX_RATE based on observed latency and errors.
+HOST_RATE = float(os.getenv("HOST_RATE", "4")) / CRAWL_PROCESSES
+HOST_MIN_RATE = float(os.getenv("HOST_MIN_RATE", "0.2")) / CRAWL_PROCESSES
+HOST_MAX_RATE = float(os.getenv("HOST_MAX_RATE", "20")) / CRAWL_PROCESSES
+HOST_BURST = max(1, int(os.getenv("HOST_BURST", "4")) // CRAWL_PROCESSES)
+HOST_TARGET_LATENCY = float(os.getenv("HOST_TARGET_LATENCY", "2.0"))
+HOST_MAX_RETRIES = int(os.getenv("HOST_MAX_RETRIES", "2"))
+HOST_MAX_BACKOFF = float(os.getenv("HOST_MAX_BACKOFF", "60"))
+
+THROTTLE_STATUSES = (429, 503)
+
+def parse_retry_after(value):
+    """Return the delay in seconds from a Retry-After header, or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+class HostState:
+    """Token bucket for one host, kept as a theoretical arrival time (GCRA)."""
+
+    def __init__(self):
+        self.rate = HOST_RATE
+        self.max_rate = HOST_MAX_RATE
+        self.next_arrival = 0.0
+        self.blocked_until = 0.0
+        self.throttle_strikes = 0
+
+class HostScheduler:
+    """Spaces out requests per host while letting different hosts run in parallel."""
+
+    def __init__(self):
+        self._hosts = {}
+
+    def _state(self, url):
+        host = urlparse(url).netloc.lower()
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = HostState()
+        return state
+
+    async def wait(self, url):
+        """Reserve the next request slot for the URL's host and sleep until it opens."""
+        state = self._state(url)
+        now = time.monotonic()
+        interval = 1.0 / state.rate
+        start = max(now, state.next_arrival - (HOST_BURST - 1) * interval, state.blocked_until)
+        state.next_arrival = max(state.next_arrival, start) + interval
+        while start > now:
+            await asyncio.sleep(start - now)
+            now = time.monotonic()
+            # A Retry-After may have arrived while we were waiting
+            start = max(start, state.blocked_until)
+
+    def record(self, url, status=None, latency=None, retry_after=None):
+        """Adapt the host's rate to a finished request (status None means a network error)."""
+        state = self._state(url)
+        if status in THROTTLE_STATUSES:
+            state.throttle_strikes += 1
+            delay = parse_retry_after(retry_after)
+            if delay is None:
+                delay = 2 ** state.throttle_strikes
+            state.blocked_until = max(state.blocked_until, time.monotonic() + min(delay, HOST_MAX_BACKOFF))
+            state.rate = max(HOST_MIN_RATE, state.rate * 0.5)
+            return
+        if status is None or status >= 500:
+            state.rate = max(HOST_MIN_RATE, state.rate * 0.7)
+            return
+        state.throttle_strikes = 0
+        if latency is not None and latency > HOST_TARGET_LATENCY:
+            state.rate = max(HOST_MIN_RATE, state.rate * 0.8)
+        else:
+            state.rate = min(state.max_rate, state.rate + 0.25)
+
+    def limit_rate(self, url, max_rate):
+        """Cap a host's rate, e.g. at 1 / the Crawl-delay from its robots.txt (never below HOST_MIN_RATE).
+
+        `max_rate` is the host's total; this process takes its CRAWL_PROCESSES share.
+        """
+        state = self._state(url)
+        state.max_rate = max(HOST_MIN_RATE, min(HOST_MAX_RATE, max_rate / CRAWL_PROCESSES))
+        state.rate = min(state.rate, state.max_rate)
+
+# Shared by every crawl in the process, so concurrent crawls hitting one host still share its budget;
+# other processes have their own, which CRAWL_PROCESSES accounts for
+scheduler = HostScheduler()
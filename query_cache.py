@@ -0,0 +1,85 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", "3600"))
+# Bounded by entry count: each entry is one cleaned /research result
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "32"))
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive cache key for a research query."""
+    return " ".join(query.casefold().split())
+
+class QueryResultCache:
+    """TTL + LRU cache of research results with single-flight coalescing of identical queries.
+
+    With a shared `backend` (see shared_state), results are also stored there,
+    so a query answered by any process is served from the cache by all of them.
+    Backend calls run in a thread, off the event loop.
+    """
+
+    def __init__(self, ttl=QUERY_CACHE_TTL, max_entries=QUERY_CACHE_SIZE, backend=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    async def get(self, query):
+        key = normalize_query(query)
+        entry = self._entries.get(key)
+        if entry is None:
+            return await self._get_shared(key)
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def _get_shared(self, key):
+        if self.backend is None or self.ttl <= 0:
+            return None
+        value = await asyncio.to_thread(self.backend.cache_get, key)
+        if value is not None:
+            self._put_local(key, value)
+        return value
+
+    async def put(self, query, value):
+        if self.ttl <= 0:
+            return
+        key = normalize_query(query)
+        self._put_local(key, value)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.cache_put, key, value, self.ttl)
+
+    def _put_local(self, key, value):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_run(self, query, run):
+        """Return a cached result, join an identical in-flight run, or start `run()`.
+
+        The shared run is shielded, so one caller disconnecting does not cancel
+        the crawl for the others; a run nobody waits for still fills the cache.
+        """
+        cached = await self.get(query)
+        if cached is not None:
+            return cached
+        key = normalize_query(query)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_and_put(query, run))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _run_and_put(self, query, run):
+        value = await run()
+        await self.put(query, value)
+        return value
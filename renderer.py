@@ -0,0 +1,195 @@
+import asyncio
+import contextlib
+import contextvars
+import logging
+import os
+import re
+import time
+
+import http_client
+import metrics
+import politeness
+
+# Headless Chromium rendering for pages whose plain HTML has almost no text (SPAs, JS-built profiles)
+RENDER_ENABLED = os.getenv("RENDER_ENABLED", "true").lower() not in ("0", "false", "no")
+# Browser contexts kept open and reused; at most this many pages render at once
+RENDER_CONTEXTS = int(os.getenv("RENDER_CONTEXTS", "2"))
+# A context is closed and replaced after rendering this many pages, which bounds its memory
+RENDER_CONTEXT_MAX_PAGES = int(os.getenv("RENDER_CONTEXT_MAX_PAGES", "50"))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "20"))
+# Extra time given to scripts to finish loading content after the DOM is ready
+RENDER_IDLE_TIMEOUT = float(os.getenv("RENDER_IDLE_TIMEOUT", "3"))
+# Pages with less text than this in headings, paragraphs, lists and tables count as thin
+RENDER_MIN_TEXT_CHARS = int(os.getenv("RENDER_MIN_TEXT_CHARS", "400"))
+
+# Requests a rendered page does not need for its text
+BLOCKED_RESOURCE_TYPES = frozenset(['image', 'font', 'media'])
+
+SCRIPT_RE = re.compile(r'<script\b', re.IGNORECASE)
+
+def text_chars(page):
+    """Characters of text in a page record's headings, paragraphs, lists and tables."""
+    total = sum(len(p) for p in page.get('paragraphs', ()))
+    total += sum(len(h) for items in page.get('headings', {}).values() for h in items if h)
+    total += sum(len(item) for items in page.get('lists', ()) for item in items if item)
+    total += sum(len(cell) for rows in page.get('tables', ()) for cells in rows for cell in cells if cell)
+    return total
+
+def needs_render(html, page):
+    """Whether a parsed page is thin and has scripts that may build its content in the browser."""
+    return RENDER_ENABLED and text_chars(page) < RENDER_MIN_TEXT_CHARS and SCRIPT_RE.search(html) is not None
+
+async def _block_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+class BrowserPool:
+    """A fixed number of reusable browser contexts in one headless Chromium.
+
+    The browser is launched on the first render, so crawls that only meet
+    static pages never start it. If playwright or its browser is missing,
+    rendering is disabled for the pool and callers keep the plain HTML.
+    """
+
+    def __init__(self, size=RENDER_CONTEXTS):
+        self.size = size
+        self.available = RENDER_ENABLED
+        self._playwright = None
+        self._browser = None
+        # One slot per context: None until first used, then [context, pages rendered]
+        self._slots = None
+        self._lock = asyncio.Lock()
+
+    async def _launch(self):
+        async with self._lock:
+            if self._browser is not None or not self.available:
+                return
+            try:
+                from playwright.async_api import async_playwright
+            except ImportError:
+                logging.warning("playwright is not installed; thin pages will not be rendered")
+                self.available = False
+                return
+            try:
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True)
+            except Exception as e:
+                logging.warning(f"Could not launch headless Chromium; thin pages will not be rendered: {e}")
+                self.available = False
+                if self._playwright is not None:
+                    await self._playwright.stop()
+                    self._playwright = None
+                return
+            self._slots = asyncio.Queue()
+            for _ in range(self.size):
+                self._slots.put_nowait(None)
+
+    async def _new_context(self):
+        context = await self._browser.new_context(user_agent=http_client.DEFAULT_HEADERS['User-Agent'])
+        await context.route('**/*', _block_resources)
+        return context
+
+    async def render(self, url):
+        """Load a URL in a browser context and return the rendered HTML, or None on failure."""
+        await self._launch()
+        if self._browser is None:
+            return None
+        slot = await self._slots.get()
+        try:
+            if slot is None:
+                slot = [await self._new_context(), 0]
+            await politeness.scheduler.wait(url)
+            started = time.monotonic()
+            page = await slot[0].new_page()
+            slot[1] += 1
+            try:
+                response = await page.goto(url, wait_until='domcontentloaded', timeout=RENDER_TIMEOUT * 1000)
+                status = response.status if response else None
+                politeness.scheduler.record(url, status, time.monotonic() - started)
+                if status is not None and status >= 400:
+                    metrics.record_fetch(url, status, time.monotonic() - started, 'render')
+                    return None
+                try:
+                    await page.wait_for_load_state('networkidle', timeout=RENDER_IDLE_TIMEOUT * 1000)
+                except Exception:
+                    # Pages that keep polling never go idle; take what has rendered so far
+                    pass
+                html = await page.content()
+                metrics.record_fetch(url, status, time.monotonic() - started, 'render', len(html))
+                return html
+            finally:
+                await page.close()
+        except Exception as e:
+            logging.error(f"Exception rendering {url}: {e}")
+            if slot is not None:
+                # The context may be broken; start a fresh one on next use
+                await self._close_context(slot)
+                slot = None
+            return None
+        finally:
+            if slot is not None and slot[1] >= RENDER_CONTEXT_MAX_PAGES:
+                await self._close_context(slot)
+                slot = None
+            self._slots.put_nowait(slot)
+
+    async def _close_context(self, slot):
+        try:
+            await slot[0].close()
+        except Exception:
+            pass
+
+    async def close(self):
+        self.available = False
+        if self._slots is not None:
+            while not self._slots.empty():
+                slot = self._slots.get_nowait()
+                if slot is not None:
+                    await self._close_context(slot)
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+_pool = None
+# Pool of a standalone run (CLI, benchmarks), set by get_pool() when there is no process-wide pool
+_current = contextvars.ContextVar('browser_pool', default=None)
+
+async def start():
+    """Create the process-wide pool. Called once at API startup; the browser starts on first use."""
+    global _pool
+    if _pool is None:
+        _pool = BrowserPool()
+    return _pool
+
+async def close():
+    """Close the process-wide pool and its browser. Called once at API shutdown."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+    _pool = None
+
+@contextlib.asynccontextmanager
+async def get_pool():
+    """Yield the pool in use, or a temporary one for a standalone run, closed when the block exits."""
+    pool = _current.get() or _pool
+    if pool is not None:
+        yield pool
+        return
+    pool = BrowserPool()
+    _current.set(pool)
+    try:
+        yield pool
+    finally:
+        _current.set(None)
+        await pool.close()
+
+async def render(url):
+    """Render a URL with the pool in use; returns None when there is none or rendering failed."""
+    pool = _current.get() or _pool
+    if pool is None or not pool.available:
+        return None
+    return await pool.render(url)
@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit, urlunsplit
+
+import download_store
+
+# On-disk HTTP cache under the ./data volume mounted by docker-compose
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() != "false"
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", os.path.join("data", "http_cache"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(20 * 1024 * 1024)))
+# Entries not used for this long are evicted even if the cache is under its size cap
+RESPONSE_CACHE_MAX_AGE = int(os.getenv("RESPONSE_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+# Upper bound for the Last-Modified freshness heuristic when a response has no explicit lifetime
+HEURISTIC_MAX_LIFETIME = 24 * 3600
+EVICT_EVERY = 50
+CACHED_HEADERS = ('Content-Type', 'Content-Disposition', 'Cache-Control', 'Expires', 'ETag', 'Last-Modified', 'Date')
+
+def cache_key(url):
+    """Hash a URL after normalizing scheme/host case and dropping the fragment."""
+    parts = urlsplit(url)
+    normalized = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', parts.query, ''))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+def parse_cache_control(value):
+    directives = {}
+    for item in (value or '').split(','):
+        name, _, arg = item.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else True
+    return directives
+
+def _http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp() if value else None
+    except (TypeError, ValueError):
+        return None
+
+def freshness_lifetime(headers, now):
+    """Seconds a response may be served without revalidation, per Cache-Control/Expires."""
+    directives = parse_cache_control(headers.get('Cache-Control'))
+    if 'no-cache' in directives:
+        return 0
+    for name in ('s-maxage', 'max-age'):
+        if name in directives:
+            try:
+                return max(0, int(directives[name]))
+            except (TypeError, ValueError):
+                return 0
+    expires = _http_date(headers.get('Expires'))
+    if headers.get('Expires') is not None:
+        return max(0, expires - now) if expires else 0
+    last_modified = _http_date(headers.get('Last-Modified'))
+    if last_modified:
+        return min(HEURISTIC_MAX_LIFETIME, max(0, (now - last_modified) / 10))
+    return 0
+
+class CacheEntry:
+    def __init__(self, meta, body_path):
+        self.meta = meta
+        self.body_path = body_path
+
+    @property
+    def url(self):
+        return self.meta['url']
+
+    def is_fresh(self):
+        return time.time() < self.meta['expires_at']
+
+    def conditional_headers(self):
+        headers = {}
+        if self.meta.get('etag'):
+            headers['If-None-Match'] = self.meta['etag']
+        if self.meta.get('last_modified'):
+            headers['If-Modified-Since'] = self.meta['last_modified']
+        return headers
+
+    def read_bytes(self):
+        with open(self.body_path, 'rb') as f:
+            return f.read()
+
+    def read_text(self):
+        return self.read_bytes().decode(self.meta.get('charset') or 'utf-8', errors='replace')
+
+class ResponseCache:
+    """URL-keyed response store with Cache-Control freshness, validators and LRU eviction."""
+
+    def __init__(self, root=RESPONSE_CACHE_DIR, max_bytes=RESPONSE_CACHE_MAX_BYTES,
+                 max_entry_bytes=RESPONSE_CACHE_MAX_ENTRY_BYTES, max_age=RESPONSE_CACHE_MAX_AGE):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.max_age = max_age
+        self._stores = 0
+        self._evicting = None
+        self._evict_lock = threading.Lock()
+
+    def _paths(self, url):
+        key = cache_key(url)
+        folder = os.path.join(self.root, key[:2])
+        return folder, os.path.join(folder, key + '.json'), os.path.join(folder, key + '.body')
+
+    def lookup(self, url):
+        """Return the cached entry for a URL, or None. Marks the entry as recently used."""
+        _, meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            os.utime(body_path)
+        except (OSError, ValueError):
+            return None
+        return CacheEntry(meta, body_path)
+
+    def store(self, url, headers, body=None, path=None, final_url=None):
+        """Store a 200 response given as bytes or as a file already on disk.
+
+        `final_url` is where the response was served from after redirects.
+        Writes to disk; async callers run it with asyncio.to_thread.
+        """
+        directives = parse_cache_control(headers.get('Cache-Control'))
+        if 'no-store' in directives:
+            return None
+        if not (headers.get('ETag') or headers.get('Last-Modified')) and freshness_lifetime(headers, time.time()) == 0:
+            # Never fresh and without validators, the entry could neither be served nor revalidated
+            return None
+        size = len(body) if body is not None else os.path.getsize(path)
+        if size > self.max_entry_bytes:
+            return None
+        folder, meta_path, body_path = self._paths(url)
+        try:
+            os.makedirs(folder, exist_ok=True)
+            tmp_path = f"{body_path}.{uuid.uuid4().hex}.tmp"
+            if body is not None:
+                with open(tmp_path, 'wb') as f:
+                    f.write(body)
+            else:
+                # Downloads already live in the download store; share the bytes instead of copying
+                download_store.link_or_copy(path, tmp_path)
+            os.replace(tmp_path, body_path)
+            entry = CacheEntry(self._meta(url, headers, size, final_url), body_path)
+            self._write_meta(meta_path, entry.meta)
+        except OSError as e:
+            logging.warning(f"Could not cache response for {url}: {e}")
+            return None
+        self._stores += 1
+        if self._stores % EVICT_EVERY == 0:
+            self._schedule_evict()
+        return entry
+
+    def _schedule_evict(self):
+        # Eviction walks the whole cache directory; keep it off the event loop when there is one
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from a thread (or sync code) that is already off the loop
+            self.evict()
+            return
+        if self._evicting is None or self._evicting.done():
+            self._evicting = loop.run_in_executor(None, self.evict)
+
+    def refresh(self, entry, headers):
+        """Update an entry's lifetime and validators after a 304 Not Modified."""
+        merged = dict(entry.meta.get('headers', {}))
+        merged.update({k: headers[k] for k in CACHED_HEADERS if k in headers})
+        entry.meta = self._meta(entry.url, merged, entry.meta['size'], entry.meta.get('final_url'))
+        _, meta_path, _ = self._paths(entry.url)
+        try:
+            self._write_meta(meta_path, entry.meta)
+        except OSError as e:
+            logging.warning(f"Could not refresh cached response for {entry.url}: {e}")
+        return entry
+
+    def _meta(self, url, headers, size, final_url=None):
+        now = time.time()
+        content_type = headers.get('Content-Type', '')
+        charset = None
+        if 'charset=' in content_type:
+            charset = content_type.split('charset=')[-1].split(';')[0].strip().strip('"')
+        return {
+            'url': url,
+            'final_url': final_url or url,
+            'size': size,
+            'stored_at': now,
+            'expires_at': now + freshness_lifetime(headers, now),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'charset': charset,
+            'headers': {k: headers[k] for k in CACHED_HEADERS if k in headers},
+        }
+
+    def _write_meta(self, meta_path, meta):
+        tmp_path = f"{meta_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def evict(self):
+        """Drop entries unused for max_age, then least recently used ones until under max_bytes."""
+        # Stores from several threads may ask at once; one walk is enough
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            self._evict()
+        finally:
+            self._evict_lock.release()
+
+    def _evict(self):
+        now = time.time()
+        entries = []
+        for folder, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith('.body'):
+                    continue
+                body_path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(body_path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, body_path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for used_at, size, body_path in entries:
+            if total <= self.max_bytes and now - used_at <= self.max_age:
+                break
+            for path in (body_path, body_path[:-len('.body')] + '.json'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+cache = ResponseCache() if RESPONSE_CACHE_ENABLED else None
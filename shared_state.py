@@ -0,0 +1,236 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+# Backend shared by every API and crawl worker process, e.g. sqlite:///data/shared.sqlite3.
+# Empty runs the single-process mode, where jobs run inside the API process.
+SHARED_BACKEND = os.getenv("SHARED_BACKEND", "")
+# A page extracted by any worker is reused by the others for this many seconds
+SHARED_PAGE_TTL = int(os.getenv("SHARED_PAGE_TTL", "3600"))
+# How long a worker may hold a URL it is extracting before another worker takes it over. Claims of a
+# worker that died block its URLs for this long; a claim that expires mid-fetch only duplicates work
+URL_CLAIM_TTL = float(os.getenv("URL_CLAIM_TTL", "30"))
+
+# Identifies this process in job leases and URL claims
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+BACKENDS = {}
+
+def register(scheme):
+    """Register a backend class for SHARED_BACKEND URLs starting with `scheme://`."""
+    def decorator(cls):
+        BACKENDS[scheme] = cls
+        return cls
+    return decorator
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    status TEXT NOT NULL,
+    query_key TEXT,
+    lease_owner TEXT,
+    lease_expires REAL,
+    finished_at REAL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_query_key ON jobs (query_key, status);
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS visited (
+    url TEXT PRIMARY KEY,
+    owner TEXT,
+    record TEXT,
+    expires_at REAL NOT NULL
+);
+"""
+
+@register("sqlite")
+class SQLiteBackend:
+    """Job queue, query result cache and visited-URL set in one SQLite file.
+
+    Every process on the machine opens the same file; WAL mode lets readers
+    run alongside the single writer, and claims run in IMMEDIATE transactions
+    so two workers never take the same job or URL. A call can wait up to 30 s
+    for another process's write lock, so async code runs the methods with
+    asyncio.to_thread; each thread gets its own connection.
+
+    Job rows hold the job's to_dict() plus its result. A running job has a
+    lease that its worker renews; a job whose lease ran out (its worker died)
+    is claimed again by the next free worker.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            # check_same_thread=False only so close() can close every thread's connection
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+            self._local.db = db
+            with self._lock:
+                self._connections.append(db)
+        return db
+
+    def _write(self, sql, params=()):
+        return self._connect().execute(sql, params)
+
+    def _transaction(self):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        return db
+
+    # Job queue
+
+    def submit_job(self, state, query_key=None):
+        self._write("INSERT INTO jobs (id, state, status, query_key, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (state["job_id"], json.dumps(state), state["status"], query_key, state["created_at"]))
+
+    def queued_count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def get_job(self, job_id):
+        row = self._connect().execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_active_job(self, query_key):
+        """Id of a queued or running job for the same query, so identical requests share it."""
+        row = self._connect().execute(
+            "SELECT id FROM jobs WHERE query_key = ? AND status IN ('queued', 'running') ORDER BY created_at LIMIT 1",
+            (query_key,)).fetchone()
+        return row[0] if row else None
+
+    def claim_job(self, owner, lease):
+        """Take the oldest queued job, or a running one whose lease expired, and return its state."""
+        now = time.time()
+        db = self._transaction()
+        try:
+            row = db.execute(
+                "SELECT id, state FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_expires < ?) "
+                "ORDER BY created_at LIMIT 1", (now,)).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            state = json.loads(row[1])
+            state["status"] = "running"
+            state["started_at"] = now
+            db.execute("UPDATE jobs SET state = ?, status = 'running', lease_owner = ?, lease_expires = ? WHERE id = ?",
+                       (json.dumps(state), owner, now + lease, row[0]))
+            db.execute("COMMIT")
+            return state
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def renew_job(self, job_id, owner, lease, progress=None):
+        """Extend a running job's lease and save its progress; False if the lease was lost."""
+        db = self._transaction()
+        try:
+            row = db.execute("SELECT state FROM jobs WHERE id = ? AND status = 'running' AND lease_owner = ?",
+                             (job_id, owner)).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return False
+            state = json.loads(row[0])
+            if progress is not None:
+                state["progress"] = progress
+            db.execute("UPDATE jobs SET state = ?, lease_expires = ? WHERE id = ?",
+                       (json.dumps(state), time.time() + lease, job_id))
+            db.execute("COMMIT")
+            return True
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def finish_job(self, state, owner):
+        """Save a finished job's state and result; False if another worker has taken the job over."""
+        cursor = self._write("UPDATE jobs SET state = ?, status = ?, finished_at = ?, lease_owner = NULL, "
+                             "lease_expires = NULL WHERE id = ? AND lease_owner = ?",
+                             (json.dumps(state), state["status"], state["finished_at"], state["job_id"], owner))
+        return cursor.rowcount > 0
+
+    def release_job(self, job_id, owner):
+        """Put a job this worker stopped running back at the front of the queue."""
+        self._write("UPDATE jobs SET status = 'queued', lease_owner = NULL, lease_expires = NULL "
+                    "WHERE id = ? AND status = 'running' AND lease_owner = ?", (job_id, owner))
+
+    # Query result cache
+
+    def cache_get(self, key):
+        row = self._connect().execute("SELECT value FROM results WHERE key = ? AND expires_at > ?",
+                                      (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def cache_put(self, key, value, ttl):
+        self._write("INSERT OR REPLACE INTO results VALUES (?, ?, ?)", (key, json.dumps(value), time.time() + ttl))
+
+    # Visited-URL set
+
+    def claim_url(self, url, owner, ttl=URL_CLAIM_TTL):
+        """Claim a URL for extraction.
+
+        Returns (True, None) if this worker should extract it, (False, record)
+        if another worker already has, and (False, None) while another worker
+        holds an unexpired claim on it.
+        """
+        now = time.time()
+        db = self._transaction()
+        try:
+            row = db.execute("SELECT owner, record FROM visited WHERE url = ? AND expires_at > ?",
+                             (url, now)).fetchone()
+            if row is not None and (row[1] is not None or row[0] != owner):
+                db.execute("COMMIT")
+                return False, json.loads(row[1]) if row[1] is not None else None
+            db.execute("INSERT OR REPLACE INTO visited VALUES (?, ?, NULL, ?)", (url, owner, now + ttl))
+            db.execute("COMMIT")
+            return True, None
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def put_url(self, url, record, ttl=SHARED_PAGE_TTL):
+        self._write("INSERT OR REPLACE INTO visited VALUES (?, NULL, ?, ?)", (url, json.dumps(record), time.time() + ttl))
+
+    def release_url(self, url, owner):
+        self._write("DELETE FROM visited WHERE url = ? AND owner = ? AND record IS NULL", (url, owner))
+
+    def prune(self, retention):
+        """Delete jobs finished more than `retention` seconds ago and expired cache and visited entries."""
+        now = time.time()
+        self._write("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (now - retention,))
+        self._write("DELETE FROM results WHERE expires_at <= ?", (now,))
+        self._write("DELETE FROM visited WHERE expires_at <= ?", (now,))
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for db in connections:
+            db.close()
+        self._local = threading.local()
+
+def open_backend(url):
+    """Open the backend for a URL such as sqlite:///data/shared.sqlite3 (relative) or sqlite:////srv/shared.sqlite3."""
+    scheme, sep, location = url.partition("://")
+    if not sep or scheme not in BACKENDS:
+        raise ValueError(f"Unsupported SHARED_BACKEND {url!r}; known schemes: {', '.join(sorted(BACKENDS))}")
+    # As in SQLAlchemy URLs, the third slash separates the location from the empty host
+    return BACKENDS[scheme](location[1:] if location.startswith("/") else location)
+
+backend = open_backend(SHARED_BACKEND) if SHARED_BACKEND else None
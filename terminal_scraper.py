@@ -1,28 +1,53 @@
+import argparse
 import asyncio
+import csv
 import json
+import hashlib
+import heapq
+import itertools
 import re
 import requests
-from urllib.parse import urlparse, urljoin, quote_plus
+from urllib.parse import urlparse, urljoin, quote_plus, parse_qsl
 from bs4 import BeautifulSoup
+from lxml import etree
 import time
-import random
 import sys
-import socket
 import os
-import mimetypes
-import fitz  # PyMuPDF
-import docx
-import openpyxl
-import pptx
-import tldextract
-from tqdm import tqdm
-import aiohttp
 import aiofiles
 from asyncio import Semaphore
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
 import logging
 
+import http_client
+import politeness
+import response_cache
+import download_store
+import fingerprints
+import metrics
+import renderer
+import shared_state
+from urls import canonicalize_url, clean_url, resolve_href, registered_domain
+from frontier import (VALUABLE_PATHS, MAX_SITEMAP_FILES, MAX_SITEMAP_URLS, MAX_SITEMAP_BYTES, SITE_HINTS_MAX_ORIGINS,
+                      SiteHints, parse_robots, parse_sitemap, score_url)
+from extractors import (DOCUMENT_EXTENSIONS, DOCUMENT_MIME_TYPES, extract_document_text, extension_for,
+                        normalize_content_type)
+from entities import extract_entities, company_entities, merge_entities, seed_entities
+
 logging.basicConfig(level=logging.INFO)
 
+# A website named in a query, e.g. "Acme Corp, www.acme.com"
+WEBSITE_RE = re.compile(r'www\.[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+')
+
+def company_website(query):
+    """URL of the company's own website if the query names one, else None."""
+    match = WEBSITE_RE.search(query)
+    if not match:
+        return None
+    website = match.group(0)
+    return website if website.startswith('http') else f"https://{website}"
+
 def google_search_urls(query, num_results=20):
     """Scrape Google search results for a query using requests."""
     print(f"Searching the web for: {query}")
@@ -32,7 +57,7 @@ def google_search_urls(query, num_results=20):
     website = None
     
     # Extract website if present
-    website_match = re.search(r'www\.[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+', query)
+    website_match = WEBSITE_RE.search(query)
     if website_match:
         website = website_match.group(0)
         # Try to extract company name from parts before the website
@@ -58,10 +83,7 @@ def google_search_urls(query, num_results=20):
         urls.append(website_url)
         
         # Add common subpages
-        for path in ['', '/about', '/about-us', '/company', '/team', '/contact', '/products', 
-                     '/services', '/blog', '/news', '/careers', '/jobs']:
-            if path == '' and website_url in urls:
-                continue
+        for path in VALUABLE_PATHS:
             urls.append(f"{website_url}{path}")
     
     # 2. Add LinkedIn search for the company
@@ -126,7 +148,7 @@ def crawl_page(url):
         }
         
         # Set a reasonable timeout
-        response = requests.get(url, timeout=20, headers=headers, allow_redirects=True)
+        response = http_client.get_sync_session().get(url, timeout=20, headers=headers, allow_redirects=True)
         response.raise_for_status()
         
         content_type = response.headers.get('Content-Type', '').lower()
@@ -221,8 +243,8 @@ def crawl_page(url):
 
 async def process_url(url):
     """Process a single URL and extract all relevant information."""
-    # Add some random delay to avoid rate limiting
-    await asyncio.sleep(random.uniform(0.5, 2.0))
+    # Wait for this host's next politeness slot instead of sleeping blindly
+    await politeness.scheduler.wait(url)
     
     page_text = crawl_page(url)
     
@@ -232,100 +254,116 @@ async def process_url(url):
         "content": page_text  # No character limit here
     }
 
-def extract_emails(text):
-    return re.findall(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", text)
+# Path segments and query parameters that mark a link without a file extension as a download
+DOWNLOAD_PATH_SEGMENTS = frozenset(['download', 'downloads', 'attachment', 'attachments'])
+DOWNLOAD_QUERY_KEYS = frozenset(['download', 'attachment', 'file', 'fileid', 'docid'])
+HTML_MIME_TYPES = frozenset(['text/html', 'application/xhtml+xml'])
+# Content-Disposition filename, plain or RFC 5987 encoded
+FILENAME_RE = re.compile(r'''filename\*?\s*=\s*(?:[\w-]+'[\w-]*')?"?([^";]+)''', re.IGNORECASE)
+
+def has_document_extension(url):
+    return os.path.splitext(urlparse(url.lower()).path)[1] in DOCUMENT_EXTENSIONS
+
+def is_document_href(href, link, site_domain):
+    """Whether a link found on a page of `site_domain` points at a document to download.
+
+    A document file extension is enough on any site. The download path and
+    query heuristics only apply to links on the page's own site; elsewhere they
+    mostly lead to installers and download listing pages.
+    """
+    if has_document_extension(href):
+        return True
+    parsed = urlparse(href.lower())
+    if not (DOWNLOAD_PATH_SEGMENTS.intersection(parsed.path.split('/'))
+            or any(key in DOWNLOAD_QUERY_KEYS for key, _ in parse_qsl(parsed.query, keep_blank_values=True))):
+        return False
+    return registered_domain(link) == site_domain
+
+def is_document_response(url, headers):
+    """Whether a download's headers show a document, checked before its body is read.
 
-def extract_phones(text):
-    return re.findall(r"\+?\d[\d\s().-]{7,}\d", text)
+    HTML is a page, not a document. A link without a document extension must
+    declare a document Content-Type or a document filename in Content-Disposition.
+    """
+    mime_type = normalize_content_type(headers.get('Content-Type'))
+    if mime_type in HTML_MIME_TYPES:
+        return False
+    if has_document_extension(url) or mime_type in DOCUMENT_MIME_TYPES:
+        return True
+    match = FILENAME_RE.search(headers.get('Content-Disposition') or '')
+    return match is not None and has_document_extension('/' + match.group(1).strip())
+
+def is_page_response(url, headers):
+    """Whether a page fetch's headers show HTML, XML or text to parse, checked before its body is read.
+
+    Responses without a Content-Type are parsed as before. Text formats that
+    are documents (CSV) and anything is_document_response accepts are not pages.
+    """
+    mime_type = normalize_content_type(headers.get('Content-Type'))
+    if mime_type in HTML_MIME_TYPES:
+        return True
+    if is_document_response(url, headers):
+        return False
+    return not mime_type or mime_type.startswith('text/') or mime_type.endswith(('/xml', '+xml'))
 
 def extract_links(soup, base_url):
     links = set()
     for a in soup.find_all('a', href=True):
-        href = a['href']
-        if href.startswith('http'):
-            links.add(href)
-        elif href.startswith('/'):
-            links.add(urljoin(base_url, href))
+        link = resolve_href(a['href'], base_url)
+        if link:
+            links.add(link)
     return links
 
 def extract_documents(soup, base_url):
     doc_links = set()
+    site_domain = registered_domain(base_url)
     for a in soup.find_all('a', href=True):
         href = a['href']
-        if any(href.lower().endswith(ext) for ext in ['.pdf', '.docx', '.xlsx', '.pptx', '.txt']):
-            if href.startswith('http'):
-                doc_links.add(href)
-            elif href.startswith('/'):
-                doc_links.add(urljoin(base_url, href))
+        link = resolve_href(href, base_url)
+        if link and is_document_href(href, link, site_domain):
+            doc_links.add(link)
     return doc_links
 
-def extract_text_from_pdf(path):
-    text = ""
-    try:
-        with fitz.open(path) as doc:
-            for page in doc:
-                text += page.get_text()
-    except Exception as e:
-        logging.error(f"PDF extraction error for {path}: {e}")
-        text = f"[PDF extraction error: {e}]"
-    return text
-
-def extract_text_from_docx(path):
-    try:
-        doc = docx.Document(path)
-        return '\n'.join([p.text for p in doc.paragraphs])
-    except Exception as e:
-        logging.error(f"DOCX extraction error for {path}: {e}")
-        return f"[DOCX extraction error: {e}]"
-
-def extract_text_from_xlsx(path):
-    try:
-        wb = openpyxl.load_workbook(path, data_only=True)
-        text = []
-        for ws in wb.worksheets:
-            for row in ws.iter_rows(values_only=True):
-                text.append('\t'.join([str(cell) if cell is not None else '' for cell in row]))
-        return '\n'.join(text)
-    except Exception as e:
-        logging.error(f"XLSX extraction error for {path}: {e}")
-        return f"[XLSX extraction error: {e}]"
-
-def extract_text_from_pptx(path):
-    try:
-        prs = pptx.Presentation(path)
-        text = []
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text.append(shape.text)
-        return '\n'.join(text)
-    except Exception as e:
-        logging.error(f"PPTX extraction error for {path}: {e}")
-        return f"[PPTX extraction error: {e}]"
+# Downloads larger than this are skipped; extractors.py caps the text taken from the rest
+MAX_DOCUMENT_BYTES = int(os.getenv("MAX_DOCUMENT_BYTES", str(50 * 1024 * 1024)))
 
-def extract_text_from_txt(path):
-    try:
-        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-            return f.read()
-    except Exception as e:
-        logging.error(f"TXT extraction error for {path}: {e}")
-        return f"[TXT extraction error: {e}]"
+def url_extension(url):
+    return os.path.splitext(urlparse(url).path)[1].lower()
 
-def download_file(url, dest_folder="downloads"):
-    os.makedirs(dest_folder, exist_ok=True)
-    local_filename = os.path.join(dest_folder, os.path.basename(url.split('?')[0]))
+def download_file(url):
+    """Download a document into the content-addressed store and return its path there."""
+    tmp_path = download_store.store.temp_path()
+    hasher = hashlib.sha256()
     try:
-        r = requests.get(url, stream=True, timeout=30)
+        r = http_client.get_sync_session().get(url, stream=True, timeout=30)
         r.raise_for_status()
-        with open(local_filename, 'wb') as f:
+        if not is_document_response(url, r.headers):
+            logging.info(f"Skipping {url}: not a document ({r.headers.get('Content-Type')})")
+            return None
+        if int(r.headers.get('Content-Length') or 0) > MAX_DOCUMENT_BYTES:
+            logging.warning(f"Skipping {url}: larger than {MAX_DOCUMENT_BYTES} bytes")
+            return None
+        size = 0
+        with open(tmp_path, 'wb') as f:
             for chunk in r.iter_content(chunk_size=8192):
+                size += len(chunk)
+                if size > MAX_DOCUMENT_BYTES:
+                    break
+                hasher.update(chunk)
                 f.write(chunk)
-        return local_filename
+        if size > MAX_DOCUMENT_BYTES:
+            logging.warning(f"Skipping {url}: larger than {MAX_DOCUMENT_BYTES} bytes")
+            os.remove(tmp_path)
+            return None
+        ext = extension_for(r.headers.get('Content-Type'), url_extension(url))
+        return download_store.store.commit(tmp_path, hasher.hexdigest(), ext)
     except Exception as e:
         logging.error(f"Exception downloading {url}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return None
 
-def extract_detailed_content(soup, url):
+def extract_detailed_content(soup, url, base_url=None):
     content = {}
     content['url'] = url
     content['title'] = soup.title.string if soup.title else "No title"
@@ -350,183 +388,1040 @@ def extract_detailed_content(soup, url):
         if items:
             content['lists'].append(items)
     content['images'] = [{'src': img.get('src'), 'alt': img.get('alt','')} for img in soup.find_all('img')]
-    page_text = soup.get_text(separator="\n", strip=True)
-    content['emails'] = extract_emails(page_text)
-    content['phones'] = extract_phones(page_text)
-    content['links'] = list(extract_links(soup, url))
+    content.update(extract_entities(soup.get_text(separator="\n", strip=True)))
+    content['links'] = list(extract_links(soup, base_url or url))
+    content['documents'] = list(extract_documents(soup, base_url or url))
     return content
 
+# BeautifulSoup's get_text() skips strings inside these tags, and so does extract_page
+NON_TEXT_TAGS = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+HEADING_TAGS = frozenset(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+
+def _parse_html(html):
+    parser = etree.HTMLParser(recover=True)
+    try:
+        return etree.fromstring(html, parser)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration
+        return etree.fromstring(html.encode('utf-8'), parser)
+
+def _element_string(el):
+    """lxml equivalent of BeautifulSoup's Tag.string: the text of a tag with exactly one child node."""
+    children = list(el)
+    if not children:
+        return el.text
+    if el.text or len(children) > 1 or children[0].tail:
+        return None
+    child = children[0]
+    return child.text if not isinstance(child.tag, str) else _element_string(child)
+
+def extract_page(html, url, base_url=None):
+    """Build the same record as extract_detailed_content in a single walk over the lxml tree.
+
+    Links are resolved against `base_url`, the URL the page was served from
+    after redirects, which defaults to `url`.
+
+    Every stripped text node is appended to one list as the walk reaches it; an
+    element's text is the slice of that list between its start and end events.
+    Headings, paragraphs, table cells and list items reserve their slot at the
+    start event so results keep BeautifulSoup's find_all() document order.
+    """
+    root = _parse_html(html)
+    strings = []
+    title = "No title"
+    title_seen = False
+    meta_description = ''
+    meta_seen = False
+    headings = {f"h{i}": [] for i in range(1, 7)}
+    paragraphs = []
+    tables = []
+    lists = []
+    images = []
+    links = {}
+    documents = {}
+    base_url = base_url or url
+    site_domain = registered_domain(base_url)
+    open_tables = []
+    open_rows = []
+    open_lists = []
+    # One entry per open element: (index into strings at its start, slots to fill at its end)
+    stack = []
+    hidden = 0
+
+    def add_text(text):
+        text = text.strip()
+        if text:
+            strings.append(text)
+
+    def reserve(targets):
+        slots = []
+        for target in targets:
+            target.append(None)
+            slots.append((target, len(target) - 1))
+        return slots
+
+    events = etree.iterwalk(root, events=('start', 'end', 'comment')) if root is not None else ()
+    for event, el in events:
+        if event == 'comment':
+            # Comments (and processing instructions, which lxml's HTML parser turns into comments)
+            if el.tail and not hidden:
+                add_text(el.tail)
+            continue
+        tag = el.tag
+        if event == 'start':
+            if tag in NON_TEXT_TAGS:
+                hidden += 1
+            slots = None
+            if tag in HEADING_TAGS:
+                slots = reserve([headings[tag]])
+            elif tag == 'p':
+                slots = reserve([paragraphs])
+            elif tag in ('td', 'th'):
+                slots = reserve(open_rows)
+            elif tag == 'li':
+                slots = reserve(open_lists)
+            elif tag == 'tr':
+                # find_all('tr') on a table includes rows of nested tables
+                cells = []
+                for rows in open_tables:
+                    rows.append(cells)
+                open_rows.append(cells)
+            elif tag == 'table':
+                rows = []
+                tables.append(rows)
+                open_tables.append(rows)
+            elif tag in ('ul', 'ol'):
+                items = []
+                lists.append(items)
+                open_lists.append(items)
+            elif tag == 'img':
+                images.append({'src': el.get('src'), 'alt': el.get('alt', '')})
+            elif tag == 'a':
+                href = el.get('href')
+                if href is not None:
+                    link = resolve_href(href, base_url)
+                    if link:
+                        links[link] = None
+                        if is_document_href(href, link, site_domain):
+                            documents[link] = None
+            elif tag == 'title' and not title_seen:
+                title_seen = True
+                title = _element_string(el)
+            elif tag == 'meta' and not meta_seen and el.get('name') == 'description':
+                meta_seen = True
+                meta_description = el.get('content') or ''
+            stack.append((len(strings), slots))
+            if el.text and not hidden:
+                add_text(el.text)
+        else:
+            start, slots = stack.pop()
+            if slots:
+                text = ''.join(strings[start:])
+                for target, index in slots:
+                    target[index] = text
+            if tag == 'tr':
+                open_rows.pop()
+            elif tag == 'table':
+                open_tables.pop()
+            elif tag in ('ul', 'ol'):
+                open_lists.pop()
+            if tag in NON_TEXT_TAGS:
+                hidden -= 1
+            if el.tail and not hidden:
+                add_text(el.tail)
+
+    # One scan of the page text finds emails, phone numbers and addresses
+    found = extract_entities("\n".join(strings))
+    return {
+        'url': url,
+        'title': title,
+        'meta_description': meta_description,
+        'headings': headings,
+        'paragraphs': [p for p in paragraphs if p],
+        'tables': [[cells for cells in rows if cells] for rows in tables if any(rows)],
+        'lists': [items for items in lists if items],
+        'images': images,
+        'emails': found['emails'],
+        'phones': found['phones'],
+        'addresses': found['addresses'],
+        'links': list(links),
+        'documents': list(documents),
+    }
+
+def parse_page(html, url, base_url=None):
+    """Parse HTML and extract the page record. Runs in the parse process pool."""
+    return extract_page(html, url, base_url)
+
 def recursive_crawl(start_url, max_pages=30, max_depth=2):
+    from tqdm import tqdm
     visited = set()
-    to_visit = [(start_url, 0)]
-    domain = tldextract.extract(start_url).registered_domain
+    # (score, discovery order, url, depth); see score_url
+    to_visit = [(float('-inf'), 0, start_url, 0)]
+    order = itertools.count(1)
+    domain = registered_domain(start_url)
     all_content = []
     with tqdm(total=max_pages, desc=f"Crawling {start_url}") as pbar:
         while to_visit and len(visited) < max_pages:
-            url, depth = to_visit.pop(0)
+            _, _, url, depth = heapq.heappop(to_visit)
             if url in visited or depth > max_depth:
                 continue
             try:
-                response = requests.get(url, timeout=15, headers={"User-Agent": "Mozilla/5.0"})
-                if response.status_code != 200:
+                response = http_client.get_sync_session().get(url, timeout=15, stream=True)
+                if response.status_code != 200 or not is_page_response(url, response.headers):
+                    response.close()
                     continue
-                soup = BeautifulSoup(response.text, "lxml")
-                content = extract_detailed_content(soup, url)
+                with response:
+                    body = response.raw.read(MAX_PAGE_BYTES + 1, decode_content=True)
+                if len(body) > MAX_PAGE_BYTES:
+                    logging.warning(f"Skipping {url}: larger than {MAX_PAGE_BYTES} bytes")
+                    continue
+                soup = BeautifulSoup(body.decode(response.encoding or 'utf-8', errors='replace'), "lxml")
+                content = extract_detailed_content(soup, url, response.url)
                 all_content.append(content)
                 visited.add(url)
                 pbar.update(1)
                 # Find new links
                 for link in extract_links(soup, url):
-                    link_domain = tldextract.extract(link).registered_domain
-                    if link_domain == domain and link not in visited:
-                        to_visit.append((link, depth+1))
+                    # Documents are downloaded by process_documents, not crawled as pages
+                    if has_document_extension(link):
+                        continue
+                    if registered_domain(link) == domain and link not in visited:
+                        heapq.heappush(to_visit, (score_url(link, depth + 1), next(order), link, depth + 1))
             except Exception as e:
                 continue
     return all_content
 
 def process_documents(doc_links):
+    from tqdm import tqdm
     docs = []
     for url in tqdm(doc_links, desc="Downloading documents"):
         local_path = download_file(url)
         if not local_path:
             continue
-        ext = os.path.splitext(local_path)[1].lower()
-        if ext == '.pdf':
-            text = extract_text_from_pdf(local_path)
-        elif ext == '.docx':
-            text = extract_text_from_docx(local_path)
-        elif ext == '.xlsx':
-            text = extract_text_from_xlsx(local_path)
-        elif ext == '.pptx':
-            text = extract_text_from_pptx(local_path)
-        elif ext == '.txt':
-            text = extract_text_from_txt(local_path)
-        else:
-            text = '[Unknown document type]'
+        digest = download_store.store.digest_of(local_path)
+        text = download_store.store.get_text(digest)
+        if text is None:
+            text = extract_document_text(local_path)
+            download_store.store.put_text(digest, text)
         docs.append({'url': url, 'local_path': local_path, 'content': text})
     return docs
 
 CONCURRENT_REQUESTS = 10
+# Seed sites crawled at once by main_batch; they share CONCURRENT_REQUESTS slots per site
+BATCH_CONCURRENT_SITES = int(os.getenv("BATCH_CONCURRENT_SITES", "4"))
+# Seconds between checks for a page another worker process is extracting
+SHARED_POLL_INTERVAL = 0.25
+# Processes for HTML parsing and document text extraction; 0 runs them in threads instead
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
 
-async def fetch_page(session, url, sem):
-    async with sem:
-        try:
-            headers = {"User-Agent": "Mozilla/5.0"}
-            async with session.get(url, timeout=15, headers=headers) as resp:
-                if resp.status != 200:
-                    logging.warning(f"Failed to fetch {url}: status {resp.status}")
-                    return None
-                text = await resp.text()
-                return text
-        except Exception as e:
-            logging.error(f"Exception fetching {url}: {e}")
+_parse_pool = None
+
+def get_parse_pool():
+    """Return the process pool for CPU-bound work, creating it on first use."""
+    global _parse_pool
+    if _parse_pool is None and PARSE_WORKERS > 0:
+        # spawn, not fork: the parent has event loop and aiofiles threads running
+        _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _parse_pool
+
+def _warm_up():
+    pass
+
+async def warm_parse_pool():
+    """Start every parse worker now; spawned workers otherwise start, and import this module, on first use."""
+    pool = get_parse_pool()
+    if pool is None:
+        return
+    loop = asyncio.get_running_loop()
+    # Submitted together, so no worker is idle yet and each one starts a new process
+    try:
+        await asyncio.gather(*(loop.run_in_executor(pool, _warm_up) for _ in range(PARSE_WORKERS)))
+    except BrokenProcessPool:
+        # Not fatal at startup; a fresh pool is created on first use
+        logging.error("Parse workers failed to start; the pool will be started again on first use")
+        shutdown_parse_pool()
+
+def shutdown_parse_pool():
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(cancel_futures=True)
+        _parse_pool = None
+
+async def run_cpu_bound(func, *args):
+    """Run CPU-heavy parsing or extraction off the event loop."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_parse_pool(), func, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM on a huge document); start a fresh pool for later calls
+        logging.error("Parse process pool broke; restarting it")
+        shutdown_parse_pool()
+        raise
+
+# Returned by fetch_page_response when the server confirms the caller's validators
+NOT_MODIFIED = 'not-modified'
+# Returned by fetch_page_response and the page extractors when a URL serves a document rather than a page
+DOCUMENT = 'document'
+# Pages larger than this are skipped; their bodies are not read past it
+MAX_PAGE_BYTES = int(os.getenv("MAX_PAGE_BYTES", str(5 * 1024 * 1024)))
+
+async def fetch_page(session, url, sem, max_bytes=MAX_PAGE_BYTES):
+    """Fetch a URL's text whatever its Content-Type (robots.txt, sitemaps), or None on failure."""
+    html, _, _ = await fetch_page_response(session, url, sem, max_bytes=max_bytes, any_type=True)
+    return html
+
+async def read_capped(resp, max_bytes):
+    """Read a response body, or return None as soon as it grows past max_bytes."""
+    if (resp.content_length or 0) > max_bytes:
+        return None
+    chunks = []
+    size = 0
+    async for chunk in resp.content.iter_chunked(65536):
+        size += len(chunk)
+        if size > max_bytes:
             return None
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+async def fetch_page_response(session, url, sem, validators=None, max_bytes=MAX_PAGE_BYTES, any_type=False):
+    """Fetch a page and return (html, headers, final URL), or (None, None, None) on failure.
+
+    The final URL is where the page was served from after redirects; its
+    relative links resolve against it. `validators` are conditional headers from an earlier crawl, used when the
+    response cache has no entry; a 304 for them returns NOT_MODIFIED as html.
+    Bodies larger than `max_bytes` are not read past the cap. Unless
+    `any_type`, the Content-Type is checked before the body is read: a
+    document returns DOCUMENT as html, anything else that is not a page fails.
+    """
+    cached = response_cache.cache.lookup(url) if response_cache.cache else None
+    if cached and cached.is_fresh():
+        if not any_type and not is_page_response(url, cached.meta['headers']):
+            # The cached response may be a document downloaded from this URL
+            return (DOCUMENT if is_document_response(url, cached.meta['headers']) else None), None, None
+        if cached.meta['size'] > max_bytes:
+            return None, None, None
+        return cached.read_text(), cached.meta['headers'], cached.meta.get('final_url', url)
+    # Stale entries are revalidated with If-None-Match / If-Modified-Since
+    headers = cached.conditional_headers() if cached else dict(validators or {})
+    for attempt in range(politeness.HOST_MAX_RETRIES + 1):
+        # Per-host pacing happens before taking a global slot, so a throttled host never blocks others
+        with metrics.timed('wait_host', metrics.WAIT_SECONDS.labels('host')):
+            await politeness.scheduler.wait(url)
+        waiting = time.monotonic()
+        async with sem:
+            started = time.monotonic()
+            metrics.record_wait('slot', started - waiting)
+            try:
+                async with session.get(url, headers=headers, timeout=http_client.PAGE_TIMEOUT) as resp:
+                    politeness.scheduler.record(url, resp.status, time.monotonic() - started,
+                                                resp.headers.get('Retry-After'))
+                    if resp.status != 200:
+                        metrics.record_fetch(url, resp.status, time.monotonic() - started, 'page')
+                    if resp.status in politeness.THROTTLE_STATUSES and attempt < politeness.HOST_MAX_RETRIES:
+                        logging.info(f"Throttled fetching {url}: status {resp.status}, retrying")
+                        continue
+                    if resp.status == 304 and cached:
+                        await asyncio.to_thread(response_cache.cache.refresh, cached, resp.headers)
+                        return cached.read_text(), resp.headers, str(resp.url)
+                    if resp.status == 304 and headers:
+                        return NOT_MODIFIED, resp.headers, str(resp.url)
+                    if resp.status != 200:
+                        logging.warning(f"Failed to fetch {url}: status {resp.status}")
+                        return None, None, None
+                    if not any_type and not is_page_response(url, resp.headers):
+                        metrics.record_fetch(url, resp.status, time.monotonic() - started, 'page')
+                        if is_document_response(url, resp.headers):
+                            return DOCUMENT, resp.headers, str(resp.url)
+                        logging.info(f"Skipping {url}: not a page ({resp.headers.get('Content-Type')})")
+                        return None, None, None
+                    body = await read_capped(resp, max_bytes)
+                    if body is None:
+                        metrics.record_fetch(url, resp.status, time.monotonic() - started, 'page')
+                        logging.warning(f"Skipping {url}: larger than {max_bytes} bytes")
+                        return None, None, None
+                    text = body.decode(resp.charset or 'utf-8', errors='replace')
+                    metrics.record_fetch(url, resp.status, time.monotonic() - started, 'page', len(body))
+                    if response_cache.cache:
+                        await asyncio.to_thread(response_cache.cache.store, url, resp.headers, body=body,
+                                                final_url=str(resp.url))
+                    return text, resp.headers, str(resp.url)
+            except Exception as e:
+                politeness.scheduler.record(url)
+                metrics.record_fetch(url, None, time.monotonic() - started, 'page')
+                logging.error(f"Exception fetching {url}: {e}")
+                return None, None, None
+    return None, None, None
+
+async def render_if_thin(url, html, content, base_url=None):
+    """Re-extract a page from a headless browser if its plain HTML was too thin to be useful.
+
+    Static pages are returned unchanged without starting a browser. The
+    rendered record is kept, marked 'rendered', only if it has more text.
+    `base_url` is the final URL of the plain fetch.
+    """
+    if not renderer.needs_render(html, content):
+        return content
+    rendered_html = await renderer.render(url)
+    if not rendered_html:
+        return content
+    try:
+        with metrics.timed('parse', metrics.PARSE_SECONDS):
+            rendered = await run_cpu_bound(parse_page, rendered_html, url, base_url)
+    except Exception as e:
+        logging.error(f"Exception parsing rendered {url}: {e}")
+        return content
+    if renderer.text_chars(rendered) <= renderer.text_chars(content):
+        return content
+    return dict(rendered, rendered=True)
 
 async def extract_detailed_content_async(session, url, sem):
-    html = await fetch_page(session, url, sem)
-    if not html:
+    html, _, final_url = await fetch_page_response(session, url, sem)
+    if not html or html == DOCUMENT:
+        return html or None
+    try:
+        with metrics.timed('parse', metrics.PARSE_SECONDS):
+            content = await run_cpu_bound(parse_page, html, url, final_url)
+    except Exception as e:
+        logging.error(f"Exception parsing {url}: {e}")
         return None
-    soup = BeautifulSoup(html, "lxml")
-    return extract_detailed_content(soup, url)
+    return await render_if_thin(url, html, content, final_url)
 
-async def recursive_crawl_async(start_url, max_pages=30, max_depth=2):
-    visited = set()
-    to_visit = [(start_url, 0)]
-    domain = tldextract.extract(start_url).registered_domain
-    all_content = []
-    sem = Semaphore(CONCURRENT_REQUESTS)
-    async with aiohttp.ClientSession() as session:
-        while to_visit and len(visited) < max_pages:
-            batch = []
-            while to_visit and len(batch) < CONCURRENT_REQUESTS and len(visited) + len(batch) < max_pages:
-                url, depth = to_visit.pop(0)
-                if url in visited or depth > max_depth:
+async def extract_shared(session, url, sem, backend):
+    """Extract a page once across every process sharing `backend` (see shared_state).
+
+    A page extracted by any worker within SHARED_PAGE_TTL is reused. While
+    another worker holds the claim on a URL, this one waits for its record;
+    if the claim expires first, this worker extracts the page itself.
+    """
+    while True:
+        claimed, record = await asyncio.to_thread(backend.claim_url, url, shared_state.WORKER_ID)
+        if record is not None:
+            return record
+        if claimed:
+            break
+        await asyncio.sleep(SHARED_POLL_INTERVAL)
+    try:
+        content = await extract_detailed_content_async(session, url, sem)
+    except BaseException:
+        # Inline, so the claim is released even if the task is cancelled again
+        backend.release_url(url, shared_state.WORKER_ID)
+        raise
+    if content:
+        await asyncio.to_thread(backend.put_url, url, content)
+    else:
+        await asyncio.to_thread(backend.release_url, url, shared_state.WORKER_ID)
+    return content
+
+async def extract_incremental(session, url, sem, fingerprint_store, lastmod=None):
+    """Fetch a page against its stored fingerprint and re-parse it only if its content changed.
+
+    Returns the page record with a 'change' key of 'new', 'changed' or
+    'unchanged'; unchanged pages reuse the record stored by the earlier crawl.
+    A page whose sitemap <lastmod> matches the stored one is not fetched at all.
+    """
+    fingerprint = await asyncio.to_thread(fingerprint_store.get, url)
+    if fingerprint and lastmod and fingerprint['sitemap_lastmod'] == lastmod:
+        await asyncio.to_thread(fingerprint_store.touch, url)
+        return dict(fingerprint['record'], change='unchanged')
+    html, headers, final_url = await fetch_page_response(session, url, sem,
+                                                         fingerprint_store.conditional_headers(fingerprint))
+    if html == NOT_MODIFIED:
+        await asyncio.to_thread(fingerprint_store.touch, url, headers, lastmod)
+        return dict(fingerprint['record'], change='unchanged')
+    if not html or html == DOCUMENT:
+        return html or None
+    content_hash = hashlib.sha256(html.encode('utf-8', errors='replace')).hexdigest()
+    if fingerprint and fingerprint['content_hash'] == content_hash:
+        await asyncio.to_thread(fingerprint_store.touch, url, headers, lastmod)
+        return dict(fingerprint['record'], change='unchanged')
+    try:
+        with metrics.timed('parse', metrics.PARSE_SECONDS):
+            content = await run_cpu_bound(parse_page, html, url, final_url)
+    except Exception as e:
+        logging.error(f"Exception parsing {url}: {e}")
+        return None
+    content = await render_if_thin(url, html, content, final_url)
+    await asyncio.to_thread(fingerprint_store.put, url, content_hash, headers, content, lastmod)
+    return dict(content, change='changed' if fingerprint else 'new')
+
+# (origin, with sitemaps) -> task loading its SiteHints
+_site_hints = {}
+
+async def load_site_hints(session, origin, sem, sitemaps=True):
+    robots_text = await fetch_page(session, origin + '/robots.txt', sem)
+    rules = parse_robots(robots_text) if robots_text else None
+    if not sitemaps:
+        return SiteHints(rules)
+    sitemaps = list((rules.site_maps() if rules else None) or [origin + '/sitemap.xml'])
+    sitemap_urls = {}
+    fetched = 0
+    while sitemaps and fetched < MAX_SITEMAP_FILES and len(sitemap_urls) < MAX_SITEMAP_URLS:
+        sitemap_url = sitemaps.pop(0)
+        text = await fetch_page(session, sitemap_url, sem, max_bytes=MAX_SITEMAP_BYTES)
+        fetched += 1
+        if not text:
+            continue
+        try:
+            urls, children = await run_cpu_bound(parse_sitemap, text)
+        except Exception as e:
+            logging.error(f"Exception parsing sitemap {sitemap_url}: {e}")
+            continue
+        for url, lastmod in urls[:MAX_SITEMAP_URLS - len(sitemap_urls)]:
+            sitemap_urls[clean_url(url)] = lastmod
+        sitemaps.extend(children)
+    return SiteHints(rules, sitemap_urls)
+
+def _hints_expired(task, now):
+    return task.done() and (task.cancelled() or task.exception() is not None or task.result().expires_at < now)
+
+def _prune_site_hints():
+    now = time.monotonic()
+    for key, task in list(_site_hints.items()):
+        if _hints_expired(task, now):
+            del _site_hints[key]
+    # Still full of fresh entries: drop the oldest finished ones to make room for one more
+    finished = [key for key, task in _site_hints.items() if task.done()]
+    for key in finished[:max(0, len(_site_hints) - SITE_HINTS_MAX_ORIGINS + 1)]:
+        del _site_hints[key]
+
+async def get_site_hints(session, url, sem, sitemaps=True):
+    """robots.txt rules and, with `sitemaps`, sitemap entries for a URL's origin, read once per SITE_HINTS_TTL."""
+    parsed = urlparse(url)
+    key = (f"{parsed.scheme}://{parsed.netloc}", sitemaps)
+    task = _site_hints.get(key)
+    if task is None or _hints_expired(task, time.monotonic()):
+        if task is None and len(_site_hints) >= SITE_HINTS_MAX_ORIGINS:
+            _prune_site_hints()
+        task = asyncio.ensure_future(load_site_hints(session, key[0], sem, sitemaps))
+        _site_hints[key] = task
+    # Concurrent crawls of one origin share the fetch; one of them stopping does not cancel it
+    return await asyncio.shield(task)
+
+async def crawl_site_stream(start_url, max_pages=30, max_depth=2, session=None, sem=None, shared_pages=None,
+                            fingerprint_store=None, crawl_state=None, company_site=True, document_urls=None):
+    """Crawl a site with a fixed pool of workers pulling from a deduplicated frontier.
+
+    Every page is fetched and parsed exactly once; outgoing links come from the
+    same parse as the page content. Page records are yielded as soon as they
+    are extracted. `sem` and `shared_pages` (URL -> extraction task) let several
+    crawls share one request limit and fetch a URL they have in common once.
+    With a `fingerprint_store` the crawl is incremental (see extract_incremental).
+
+    The frontier is a priority queue ordered by score_url, so the page budget
+    goes to company information before navigation and legal pages. For the
+    company's own site (`company_site`) it is also seeded with the sitemap
+    entries and VALUABLE_PATHS; third-party seeds such as LinkedIn or search
+    pages are crawled from the seed URL only. URLs disallowed by robots.txt
+    are dropped before they are fetched.
+
+    `crawl_state`, if given, is a dict kept up to date with the frontier
+    ('pending' URL -> [priority, depth]), the seen set and the number of pages
+    yielded, so a checkpoint can be taken after any yielded page. Passing a
+    saved state back in resumes that crawl instead of starting over.
+
+    URLs that turn out to serve a document rather than a page are appended to
+    the `document_urls` list, if given, to be downloaded with the linked ones.
+    """
+    start_url = clean_url(start_url)
+    domain = registered_domain(start_url)
+    parsed = urlparse(start_url)
+    origin = f"{parsed.scheme}://{parsed.netloc}"
+    user_agent = http_client.DEFAULT_HEADERS['User-Agent']
+    frontier = asyncio.PriorityQueue()
+    order = itertools.count()
+    # Canonical URLs (see canonicalize_url) of every URL queued so far; pages are fetched at their clean_url()
+    seen = set()
+    hints = SiteHints()
+    # (URL, page record) of each extracted page, then None once the crawl is done
+    results = asyncio.Queue()
+    # URLs queued or in flight, dropped once their page is yielded or their fetch fails
+    pending = {}
+    resuming = bool(crawl_state and crawl_state.get('pending') is not None)
+    pages_found = crawl_state.get('yielded', 0) if resuming else 0
+    if pages_found >= max_pages:
+        return
+    # Each started fetch reserves one page of budget; failed fetches hand it back.
+    budget = Semaphore(max_pages - pages_found)
+    budget_spent = asyncio.Event()
+    sem = sem or Semaphore(CONCURRENT_REQUESTS)
+
+    def enqueue(url, depth, priority=None):
+        seen.add(canonicalize_url(url))
+        if priority is None:
+            priority = score_url(url, depth, hints.lastmod(url))
+        pending[url] = [priority, depth]
+        # The counter keeps equal scores in discovery order
+        frontier.put_nowait((priority, next(order), url, depth))
+        metrics.FRONTIER_URLS.inc()
+
+    def extract(url):
+        if fingerprint_store is not None:
+            return extract_incremental(session, url, sem, fingerprint_store, hints.lastmod(url))
+        if shared_state.backend is not None:
+            return extract_shared(session, url, sem, shared_state.backend)
+        return extract_detailed_content_async(session, url, sem)
+
+    def extract_once(url):
+        if shared_pages is None:
+            return extract(url)
+        key = canonicalize_url(url)
+        task = shared_pages.get(key)
+        if task is None:
+            task = asyncio.ensure_future(extract(url))
+            shared_pages[key] = task
+        # Another crawl may still need this page after this one stops
+        return asyncio.shield(task)
+
+    async def worker(session):
+        nonlocal pages_found
+        while True:
+            _, _, url, depth = await frontier.get()
+            metrics.FRONTIER_URLS.dec()
+            holds_budget = False
+            try:
+                url_hints = hints if url.startswith(origin + '/') else await get_site_hints(session, url, sem, sitemaps=False)
+                if not url_hints.allowed(url, user_agent):
+                    logging.info(f"Skipping {url}: disallowed by robots.txt")
+                    pending.pop(url, None)
                     continue
-                batch.append((url, depth))
-            tasks = [extract_detailed_content_async(session, url, sem) for url, _ in batch]
-            results = await asyncio.gather(*tasks)
-            for (url, depth), content in zip(batch, results):
-                if content:
-                    all_content.append(content)
-                    visited.add(url)
-                    # Find new links
-                    soup = BeautifulSoup(await fetch_page(session, url, sem), "lxml")
-                    for link in extract_links(soup, url):
-                        link_domain = tldextract.extract(link).registered_domain
-                        if link_domain == domain and link not in visited:
-                            to_visit.append((link, depth+1))
-    return all_content
+                await budget.acquire()
+                holds_budget = True
+                content = await extract_once(url)
+                if content == DOCUMENT:
+                    if document_urls is not None:
+                        document_urls.append(url)
+                    content = None
+                if not content:
+                    budget.release()
+                    pending.pop(url, None)
+                    continue
+                results.put_nowait((url, content))
+                holds_budget = False
+                pages_found += 1
+                if pages_found >= max_pages:
+                    budget_spent.set()
+                if depth >= max_depth:
+                    continue
+                for link in content['links']:
+                    # Documents are downloaded separately, not crawled
+                    if canonicalize_url(link) in seen or has_document_extension(link):
+                        continue
+                    if registered_domain(link) == domain:
+                        enqueue(link, depth + 1)
+            except Exception as e:
+                # One failing URL (a locked database, a cache file race) must not take the worker down:
+                # with every worker gone the frontier never drains and the crawl never ends
+                logging.error(f"Exception crawling {url}: {e}")
+                if holds_budget:
+                    budget.release()
+                pending.pop(url, None)
+            finally:
+                frontier.task_done()
+
+    async def close_when_done():
+        drained = asyncio.create_task(frontier.join())
+        spent = asyncio.create_task(budget_spent.wait())
+        try:
+            await asyncio.wait([drained, spent], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            drained.cancel()
+            spent.cancel()
+        # Every page is queued before its URL is marked done, so this comes last
+        results.put_nowait(None)
+
+    async with http_client.get_session(session) as session, renderer.get_pool():
+        hints = await get_site_hints(session, start_url, sem, sitemaps=company_site)
+        crawl_delay = hints.crawl_delay(user_agent)
+        if crawl_delay:
+            politeness.scheduler.limit_rate(start_url, 1.0 / float(crawl_delay))
+        if resuming:
+            seen.update(crawl_state['seen'])
+            for url, (priority, depth) in crawl_state['pending'].items():
+                enqueue(url, depth, priority)
+        else:
+            # The seed URL always goes first
+            enqueue(start_url, 0, priority=float('-inf'))
+            if max_depth >= 1 and company_site:
+                for url in [origin + path for path in VALUABLE_PATHS] + list(hints.sitemap_urls):
+                    if (canonicalize_url(url) not in seen and not has_document_extension(url)
+                            and registered_domain(url) == domain):
+                        enqueue(url, 1)
+        if crawl_state is not None:
+            crawl_state.update({'pending': pending, 'seen': seen, 'yielded': pages_found})
+        tasks = [asyncio.create_task(worker(session)) for _ in range(CONCURRENT_REQUESTS)]
+        tasks.append(asyncio.create_task(close_when_done()))
+        metrics.ACTIVE_CRAWLS.inc()
+        try:
+            while True:
+                item = await results.get()
+                if item is None:
+                    break
+                url, content = item
+                pending.pop(url, None)
+                if crawl_state is not None:
+                    crawl_state['yielded'] += 1
+                yield content
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            metrics.ACTIVE_CRAWLS.dec()
+            # URLs left unvisited once the page budget ran out
+            metrics.FRONTIER_URLS.dec(frontier.qsize())
+
+async def recursive_crawl_async(start_url, max_pages=30, max_depth=2, session=None):
+    return [content async for content in crawl_site_stream(start_url, max_pages, max_depth, session)]
 
-async def download_file_async(session, url, dest_folder="downloads", sem=None):
-    os.makedirs(dest_folder, exist_ok=True)
-    local_filename = os.path.join(dest_folder, os.path.basename(url.split('?')[0]))
+async def recursive_crawl_incremental(start_url, max_pages=30, max_depth=2, session=None, fingerprint_store=None):
+    """Re-crawl a site and return what changed since the fingerprints stored by earlier crawls.
+
+    Returns {'site', 'new': [page records], 'changed': [page records], 'unchanged': [urls]}.
+    """
+    fingerprint_store = fingerprint_store or fingerprints.store
+    diff = {'site': start_url, 'new': [], 'changed': [], 'unchanged': []}
+    async for page in crawl_site_stream(start_url, max_pages, max_depth, session, fingerprint_store=fingerprint_store):
+        if page['change'] == 'unchanged':
+            diff['unchanged'].append(page['url'])
+        else:
+            diff[page['change']].append(page)
+    return diff
+
+async def download_file_async(session, url, sem=None):
+    """Download a document into the content-addressed store, hashing it while it streams."""
+    cached = response_cache.cache.lookup(url) if response_cache.cache else None
+    if cached and cached.is_fresh():
+        # The cached response may be the page a download link led to
+        if not is_document_response(url, cached.meta['headers']):
+            return None
+        ext = extension_for(cached.meta['headers'].get('Content-Type'), url_extension(url))
+        return await asyncio.to_thread(download_store.store.add_file, cached.body_path, ext)
+    headers = cached.conditional_headers() if cached else {}
+    tmp_path = download_store.store.temp_path()
+    hasher = hashlib.sha256()
+    started = time.monotonic()
     try:
+        with metrics.timed('wait_host', metrics.WAIT_SECONDS.labels('host')):
+            await politeness.scheduler.wait(url)
+        waiting = time.monotonic()
         async with sem:
-            async with session.get(url, timeout=30) as resp:
+            started = time.monotonic()
+            metrics.record_wait('slot', started - waiting)
+            async with session.get(url, headers=headers, timeout=http_client.DOWNLOAD_TIMEOUT) as resp:
+                politeness.scheduler.record(url, resp.status, time.monotonic() - started,
+                                            resp.headers.get('Retry-After'))
+                if resp.status != 200:
+                    metrics.record_fetch(url, resp.status, time.monotonic() - started, 'document')
+                if resp.status == 304 and cached:
+                    await asyncio.to_thread(response_cache.cache.refresh, cached, resp.headers)
+                    if not is_document_response(url, cached.meta['headers']):
+                        return None
+                    ext = extension_for(cached.meta['headers'].get('Content-Type'), url_extension(url))
+                    return await asyncio.to_thread(download_store.store.add_file, cached.body_path, ext)
                 if resp.status != 200:
                     logging.warning(f"Failed to download {url}: status {resp.status}")
                     return None
-                async with aiofiles.open(local_filename, 'wb') as f:
+                if not is_document_response(url, resp.headers):
+                    logging.info(f"Skipping {url}: not a document ({resp.headers.get('Content-Type')})")
+                    return None
+                if (resp.content_length or 0) > MAX_DOCUMENT_BYTES:
+                    logging.warning(f"Skipping {url}: larger than {MAX_DOCUMENT_BYTES} bytes")
+                    return None
+                size = 0
+                async with aiofiles.open(tmp_path, 'wb') as f:
                     async for chunk in resp.content.iter_chunked(8192):
+                        size += len(chunk)
+                        if size > MAX_DOCUMENT_BYTES:
+                            break
+                        hasher.update(chunk)
                         await f.write(chunk)
-        return local_filename
+                if size > MAX_DOCUMENT_BYTES:
+                    # No Content-Length (or a wrong one); stop reading once the cap is passed
+                    logging.warning(f"Skipping {url}: larger than {MAX_DOCUMENT_BYTES} bytes")
+                    os.remove(tmp_path)
+                    return None
+                metrics.record_fetch(url, resp.status, time.monotonic() - started, 'document', size)
+                # Links like /download?id=5 carry no extension; name the file from its Content-Type
+                ext = extension_for(resp.headers.get('Content-Type'), url_extension(url))
+                local_path = download_store.store.commit(tmp_path, hasher.hexdigest(), ext)
+                if response_cache.cache:
+                    await asyncio.to_thread(response_cache.cache.store, url, resp.headers, path=local_path)
+        return local_path
     except Exception as e:
+        metrics.record_fetch(url, None, time.monotonic() - started, 'document')
         logging.error(f"Exception downloading {url}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return None
 
-async def process_documents_async(doc_links):
-    docs = []
-    sem = Semaphore(CONCURRENT_REQUESTS)
-    async with aiohttp.ClientSession() as session:
-        tasks = [download_file_async(session, url, sem=sem) for url in doc_links]
-        local_paths = await asyncio.gather(*tasks)
-    for url, local_path in zip(doc_links, local_paths):
+async def process_documents_stream(doc_links, session=None, sem=None, shared_documents=None):
+    """Download documents concurrently and yield each one as soon as its text is extracted.
+
+    `shared_documents` (URL -> task) lets several calls download a document they have in common once.
+    """
+    sem = sem or Semaphore(CONCURRENT_REQUESTS)
+
+    async def download_and_extract(url):
+        local_path = await download_file_async(session, url, sem=sem)
         if not local_path:
-            continue
-        ext = os.path.splitext(local_path)[1].lower()
-        if ext == '.pdf':
-            text = extract_text_from_pdf(local_path)
-        elif ext == '.docx':
-            text = extract_text_from_docx(local_path)
-        elif ext == '.xlsx':
-            text = extract_text_from_xlsx(local_path)
-        elif ext == '.pptx':
-            text = extract_text_from_pptx(local_path)
-        elif ext == '.txt':
-            text = extract_text_from_txt(local_path)
-        else:
-            text = '[Unknown document type]'
-        docs.append({'url': url, 'local_path': local_path, 'content': text})
-    return docs
+            return None
+        # The same document is often linked from many sites; extract each content hash once
+        digest = download_store.store.digest_of(local_path)
+        text = download_store.store.get_text(digest)
+        if text is None:
+            # Extraction runs in the parse pool, so several documents are extracted in parallel
+            doc_format = os.path.splitext(local_path)[1].lstrip('.') or 'unknown'
+            try:
+                with metrics.timed('extraction', metrics.EXTRACTION_SECONDS.labels(doc_format)):
+                    text = await run_cpu_bound(extract_document_text, local_path)
+            except Exception as e:
+                logging.error(f"Extraction error for {local_path}: {e}")
+                return {'url': url, 'local_path': local_path, 'content': f"[Extraction error: {e}]"}
+            download_store.store.put_text(digest, text)
+        return {'url': url, 'local_path': local_path, 'content': text}
+
+    def download_once(url):
+        if shared_documents is None:
+            return asyncio.create_task(download_and_extract(url))
+        task = shared_documents.get(url)
+        if task is None:
+            task = asyncio.ensure_future(download_and_extract(url))
+            shared_documents[url] = task
+        return asyncio.ensure_future(asyncio.shield(task))
+
+    async with http_client.get_session(session) as session:
+        tasks = [download_once(url) for url in doc_links]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                document = await next_done
+                if document:
+                    yield document
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+def company_documents(pages, company_site):
+    """Document links collected from a site's pages.
 
-async def main(query):
+    On third-party sites only links with a document extension are kept; links
+    found by the download path heuristics are trusted on the company's own site.
+    """
+    for page in pages:
+        for link in page.get('documents', ()):
+            if company_site or has_document_extension(link):
+                yield link
+
+async def process_documents_async(doc_links, session=None):
+    return [doc async for doc in process_documents_stream(doc_links, session)]
+
+async def main_stream(query, progress=None, checkpoint=None):
+    """Research a company, yielding events as results become available.
+
+    Events are dicts with a 'type' of 'site' (a seed URL is about to be crawled),
+    'page', 'document' or 'site_done', then one final 'entities' event with the
+    contact details from the company's own site and the social profiles its
+    other seeds point at. `progress`, if given, is called with dicts of
+    updated counters.
+
+    With a `checkpoint` (a checkpoints.JobCheckpoint), the search results and
+    each site's pages, documents and crawl frontier are saved as the research
+    goes. A run with the checkpoint of an interrupted job replays what was
+    saved and only fetches what is left.
+    """
     print(f"Starting comprehensive company research for: {query}")
-    urls = google_search_urls(query, num_results=10)
-    all_results = []
-    for url in urls:
-        print(f"\nRecursively crawling: {url}")
-        site_content = await recursive_crawl_async(url, max_pages=30, max_depth=2)
-        # Collect all document links from all pages
-        doc_links = set()
-        for page in site_content:
-            html = page.get('html') if 'html' in page else None
-            if not html:
-                try:
-                    async with aiohttp.ClientSession() as session:
-                        html = await fetch_page(session, page['url'], Semaphore(1))
-                except Exception:
-                    continue
-            soup = BeautifulSoup(html, "lxml")
-            doc_links.update(extract_documents(soup, page['url']))
-        documents = await process_documents_async(list(doc_links))
-        all_results.append({'site': url, 'pages': site_content, 'documents': documents})
+    urls = await checkpoint.load_seeds() if checkpoint else None
+    if urls is None:
+        with metrics.timed('search'):
+            urls = google_search_urls(query, num_results=10)
+        if checkpoint:
+            await checkpoint.save_seeds(urls)
+    website = company_website(query)
+    company_domain = registered_domain(website) if website else None
+    sites_done = 0
+    pages_total = 0
+    documents_total = 0
+    entity_sets = []
+    if progress:
+        progress({'sites_total': len(urls), 'sites_done': 0, 'pages': 0, 'documents': 0})
+    # One pooled session and browser pool for the whole run; the API process shares its own across requests
+    async with http_client.get_session() as session, renderer.get_pool():
+        for url in urls:
+            company_site = company_domain is not None and registered_domain(url) == company_domain
+            state = (await checkpoint.load(url) if checkpoint else None) or {'pages': [], 'documents': []}
+            if state['pages'] or state['documents']:
+                print(f"\nResuming: {url} ({len(state['pages'])} pages, {len(state['documents'])} documents saved)")
+            else:
+                print(f"\nRecursively crawling: {url}")
+            if progress:
+                progress({'current_site': url})
+            yield {'type': 'site', 'site': url}
+            for page in state['pages']:
+                pages_total += 1
+                yield {'type': 'page', 'site': url, 'page': page}
+            if not state.get('crawl_done'):
+                crawl_state = state.setdefault('crawl', {})
+                async for page in crawl_site_stream(url, max_pages=30, max_depth=2, session=session,
+                                                    crawl_state=crawl_state, company_site=company_site,
+                                                    document_urls=state.setdefault('document_urls', [])):
+                    state['pages'].append(page)
+                    if checkpoint:
+                        await checkpoint.save(url, state)
+                    pages_total += 1
+                    yield {'type': 'page', 'site': url, 'page': page}
+                state['crawl_done'] = True
+                del state['crawl']
+                if checkpoint:
+                    await checkpoint.save(url, state, force=True)
+            # Document links were collected from each page's parse during the crawl
+            doc_links = set(company_documents(state['pages'], company_site))
+            doc_links.update(state.get('document_urls', ()))
+            for document in state['documents']:
+                doc_links.discard(document['url'])
+                documents_total += 1
+                yield {'type': 'document', 'site': url, 'document': document}
+            if not state.get('done'):
+                async for document in process_documents_stream(list(doc_links), session=session):
+                    state['documents'].append(document)
+                    if checkpoint:
+                        await checkpoint.save(url, state)
+                    documents_total += 1
+                    yield {'type': 'document', 'site': url, 'document': document}
+                state['done'] = True
+                if checkpoint:
+                    await checkpoint.save(url, state, force=True)
+            sites_done += 1
+            if progress:
+                progress({'sites_done': sites_done, 'pages': pages_total, 'documents': documents_total})
+            # Only the company's own site is scanned; a third-party seed adds at most the profile it points at
+            entity_sets.append(company_entities(state['pages'], state['documents']) if company_site
+                               else seed_entities(url))
+            yield {'type': 'site_done', 'site': url, 'pages': len(state['pages']),
+                   'documents': len(state['documents'])}
+    yield {'type': 'entities', 'entities': merge_entities(entity_sets)}
     print("\nResearch completed. Returning all detailed data.")
-    return all_results
+
+async def main(query, progress=None, checkpoint=None):
+    """Research a company and return {'sites': pages and documents grouped by seed site, 'entities': ...}.
+
+    'entities' holds the emails, phone numbers and addresses found on the
+    company's own site and its social profiles, deduplicated.
+    """
+    all_results = []
+    entities = None
+    async for event in main_stream(query, progress, checkpoint):
+        if event['type'] == 'site':
+            all_results.append({'site': event['site'], 'pages': [], 'documents': []})
+        elif event['type'] == 'page':
+            all_results[-1]['pages'].append(event['page'])
+        elif event['type'] == 'document':
+            all_results[-1]['documents'].append(event['document'])
+        elif event['type'] == 'entities':
+            entities = event['entities']
+    return {'sites': all_results, 'entities': entities}
+
+async def main_batch(queries, progress=None, incremental=False):
+    """Research many companies at once and return {query: results shaped like main()}.
+
+    Seed URLs are deduplicated across the whole batch and each unique seed is
+    crawled once. All crawls share one request limit, and a page or document
+    reached from several seeds is fetched once, so the number of fetches grows
+    with the number of unique URLs rather than with the number of queries.
+
+    With `incremental`, each site's 'pages' holds only pages that are new or
+    changed since the last crawl, plus an 'unchanged' list of URLs, and only
+    the documents linked from those pages are downloaded.
+    """
+    queries = list(dict.fromkeys(q for q in queries if q))
+    seeds_by_query = {query: google_search_urls(query, num_results=10) for query in queries}
+    seeds = list(dict.fromkeys(url for urls in seeds_by_query.values() for url in urls))
+    company_domains = {registered_domain(website) for website in map(company_website, queries) if website}
+    print(f"Batch of {len(queries)} queries: {sum(len(u) for u in seeds_by_query.values())} seed URLs, "
+          f"{len(seeds)} unique")
+    sem = Semaphore(CONCURRENT_REQUESTS * BATCH_CONCURRENT_SITES)
+    sites_sem = Semaphore(BATCH_CONCURRENT_SITES)
+    shared_pages = {}
+    shared_documents = {}
+    # A seed shared by several queries is scanned once; its entities are merged into each query's
+    entities_by_seed = {}
+    fingerprint_store = fingerprints.store if incremental else None
+    counters = {'queries': len(queries), 'sites_total': len(seeds), 'sites_done': 0, 'pages': 0, 'documents': 0}
+    if progress:
+        progress(dict(counters))
+
+    async def research_site(url, session):
+        company_site = registered_domain(url) in company_domains
+        document_urls = []
+        async with sites_sem:
+            pages = [page async for page in crawl_site_stream(url, max_pages=30, max_depth=2, session=session,
+                                                                sem=sem, shared_pages=shared_pages,
+                                                                fingerprint_store=fingerprint_store,
+                                                                company_site=company_site,
+                                                                document_urls=document_urls)]
+            unchanged = [page['url'] for page in pages if page.get('change') == 'unchanged']
+            crawled = pages
+            if incremental:
+                pages = [page for page in pages if page['change'] != 'unchanged']
+            doc_links = set(company_documents(pages, company_site))
+            doc_links.update(document_urls)
+            documents = [doc async for doc in process_documents_stream(list(doc_links), session=session, sem=sem,
+                                                                       shared_documents=shared_documents)]
+        counters['sites_done'] += 1
+        counters['pages'] += len(pages)
+        counters['documents'] += len(documents)
+        if progress:
+            progress(dict(counters))
+        # Entities cover every page crawled on the company's own site, unchanged ones included, and the
+        # documents fetched this run; a third-party seed adds at most the profile it points at
+        entities_by_seed[url] = company_entities(crawled, documents) if company_site else seed_entities(url)
+        if incremental:
+            return {'site': url, 'pages': pages, 'documents': documents, 'unchanged': unchanged}
+        return {'site': url, 'pages': pages, 'documents': documents}
+
+    async with http_client.get_session() as session, renderer.get_pool():
+        try:
+            sites = await asyncio.gather(*[research_site(url, session) for url in seeds])
+        finally:
+            # Shared fetches whose crawls stopped early are no longer needed
+            for task in list(shared_pages.values()) + list(shared_documents.values()):
+                task.cancel()
+            await asyncio.gather(*shared_pages.values(), *shared_documents.values(), return_exceptions=True)
+    print(f"Batch completed: {len(shared_pages)} unique pages and {len(shared_documents)} unique documents fetched")
+    by_seed = dict(zip(seeds, sites))
+    return {query: {'sites': [by_seed[url] for url in urls],
+                    'entities': merge_entities(entities_by_seed[url] for url in urls)}
+            for query, urls in seeds_by_query.items()}
+
+def read_batch_queries(path):
+    """Read one query per row from the first column of a CSV file, skipping a header row."""
+    with open(path, newline='', encoding='utf-8') as f:
+        queries = [row[0].strip() for row in csv.reader(f) if row and row[0].strip()]
+    if queries and queries[0].lower() in ('query', 'company', 'name'):
+        queries = queries[1:]
+    return queries
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Research companies from the web and their documents.")
+    parser.add_argument("query", nargs="*", help="company name and/or website")
+    parser.add_argument("--batch", metavar="CSV", help="research every query in the first column of a CSV file")
+    parser.add_argument("--output", default="batch_results.json", help="where --batch writes its results")
+    parser.add_argument("--incremental", action="store_true",
+                        help="with --batch, return only pages that changed since the last crawl")
+    args = parser.parse_args()
+
+    if args.batch:
+        queries = read_batch_queries(args.batch)
+        if not queries:
+            print(f"No queries found in {args.batch}. Exiting.")
+            sys.exit(1)
+        results = asyncio.run(main_batch(queries, incremental=args.incremental))
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False)
+        print(f"Wrote results for {len(results)} queries to {args.output}")
+        sys.exit(0)
+
     # If arguments provided, use them as query
-    if len(sys.argv) > 1:
-        query = " ".join(sys.argv[1:])
+    if args.query:
+        query = " ".join(args.query)
     else:
         # Otherwise prompt for input
         query = input("Enter company name and/or website: ")
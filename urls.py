@@ -0,0 +1,104 @@
+import functools
+from urllib.parse import urlsplit, urlunsplit, urljoin, parse_qsl, urlencode, quote
+
+import tldextract
+
+# Query parameters that only identify a campaign or click, never a different page
+TRACKING_PARAM_PREFIXES = ('utm_', 'mtm_', 'pk_', 'hsa_')
+TRACKING_PARAMS = frozenset(['gclid', 'gclsrc', 'dclid', 'fbclid', 'msclkid', 'yclid', 'igshid', 'twclid',
+                             'mc_cid', 'mc_eid', '_ga', '_gl', '_hsenc', '_hsmi', 'hsctatracking', 'mkt_tok',
+                             'ref_src', 'spm', 'trk', 's_kwcid', 'vero_id', 'oly_anon_id', 'oly_enc_id'])
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+# Schemes of hrefs that never point at a crawlable page
+SKIPPED_SCHEMES = ('mailto:', 'tel:', 'javascript:', 'data:', 'sms:', 'ftp:')
+
+# Uses the public suffix list bundled with tldextract; it never fetches the list over the network
+_extract = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+
+def remove_dot_segments(path):
+    """Resolve '.' and '..' segments as in RFC 3986 section 5.2.4."""
+    segments = []
+    for segment in path.split('/'):
+        if segment == '..':
+            if len(segments) > 1:
+                segments.pop()
+        elif segment != '.':
+            segments.append(segment)
+    if path.endswith(('/.', '/..')):
+        segments.append('')
+    return '/'.join(segments)
+
+def is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PARAM_PREFIXES)
+
+def clean_url(url):
+    """Normalized, still fetchable form of an http(s) URL.
+
+    Lowercases the scheme and host, drops default ports, fragments and
+    tracking parameters and resolves dot segments. A trailing slash is kept:
+    relative links on /blog/ and /blog resolve differently. Other URLs are
+    returned unchanged.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+    host = parts.hostname.rstrip('.')
+    if ':' in host:
+        host = f"[{host}]"
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    if parts.username:
+        userinfo = parts.username + (f":{parts.password}" if parts.password else '')
+        host = f"{userinfo}@{host}"
+    path = quote(remove_dot_segments(parts.path), safe="/%:@!$&'()*+,;=~") or '/'
+    query = parts.query
+    if query:
+        params = parse_qsl(query, keep_blank_values=True)
+        kept = [(k, v) for k, v in params if not is_tracking_param(k)]
+        if len(kept) != len(params):
+            query = urlencode(kept)
+    return urlunsplit((scheme, host, path, query, ''))
+
+def canonicalize_url(url):
+    """Canonical form of an http(s) URL, so variants of one page dedupe to one frontier entry.
+
+    The clean_url() form without the trailing slash of non-root paths. It is a
+    dedupe key only; pages are fetched, and their links resolved, at clean_url().
+    """
+    url = clean_url(url)
+    parts = urlsplit(url)
+    if parts.scheme not in DEFAULT_PORTS or len(parts.path) <= 1 or not parts.path.endswith('/'):
+        return url
+    return urlunsplit(parts._replace(path=parts.path.rstrip('/') or '/'))
+
+def resolve_href(href, base_url):
+    """Return the clean absolute URL an href points to, or None if it is not a web page link.
+
+    Handles absolute, protocol-relative, root-relative and relative hrefs
+    (including './' and '../'). `base_url` must be the URL the page was
+    served from, after redirects.
+    """
+    href = href.strip()
+    if not href or href.startswith('#') or href.lower().startswith(SKIPPED_SCHEMES):
+        return None
+    absolute = urljoin(base_url, href)
+    if not absolute.lower().startswith(('http://', 'https://')):
+        return None
+    return clean_url(absolute)
+
+@functools.lru_cache(maxsize=4096)
+def _registered_domain(host):
+    # IP addresses and single-label hosts have no registered domain; the host stands in for it
+    return _extract(host).registered_domain or host
+
+def registered_domain(url):
+    """Registered domain (e.g. example.co.uk) of a URL, memoized per host."""
+    host = urlsplit(url).hostname or ''
+    return _registered_domain(host)
@@ -0,0 +1,53 @@
+import asyncio
+import logging
+import os
+import sys
+
+from prometheus_client import start_http_server
+
+import checkpoints
+import http_client
+import renderer
+import shared_state
+import terminal_scraper
+from app import run_job
+from jobs import SharedJobManager
+
+# Port of this worker's Prometheus metrics endpoint (the API's /metrics only covers the API process);
+# give each worker on a machine its own port, or 0 to turn it off
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9101"))
+
+async def main():
+    """Run research jobs from the SHARED_BACKEND queue until interrupted.
+
+    Start one per CPU or machine; each runs JOB_WORKERS jobs at once. API
+    processes with the same SHARED_BACKEND queue the jobs and serve results.
+    """
+    if shared_state.backend is None:
+        print("SHARED_BACKEND is not set; the API runs jobs itself in single-process mode. Exiting.")
+        sys.exit(1)
+    if WORKER_METRICS_PORT:
+        try:
+            start_http_server(WORKER_METRICS_PORT)
+        except OSError as e:
+            logging.warning(f"Could not serve metrics on port {WORKER_METRICS_PORT}: {e}")
+    await http_client.start()
+    await renderer.start()
+    await terminal_scraper.warm_parse_pool()
+    manager = SharedJobManager(run_job, shared_state.backend, store=checkpoints.store)
+    await manager.start()
+    logging.info(f"Crawl worker {manager.worker_id} waiting for jobs")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        # Unfinished jobs go back to the queue for the other workers
+        await manager.stop()
+        await renderer.close()
+        await http_client.close()
+        terminal_scraper.shutdown_parse_pool()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass